@@ -1,14 +1,29 @@
-from dash import dcc, html
+import functools
+import json
+from dash import dcc, html, ClientsideFunction
+from flask import Response, abort, request
 import plotly.express as px
-import pandas as pd
-from dash.dependencies import Input, Output
+import config
+import data
+import prerender
+from dash.dependencies import Input, Output, State
+from figure_cache import cached_figure
+from figures import with_projection, register_projection_toggle, slim_figure
 from sidebar import sidebar
 
-# Load the data
-GDPMap = pd.read_csv("C:/Users/William/Documents/FYPWS/demo/GDPMap.csv")
+# Data for years 1950 to 2018, filtered on first use
+@data.derived('gdp')
+def gdp_rows(GDPMap):
+    return GDPMap[(GDPMap['Year'] >= 1950) & (GDPMap['Year'] <= 2018)]
 
-# Filter data for years 1950 to 2018
-filtered_data = GDPMap[(GDPMap['Year'] >= 1950) & (GDPMap['Year'] <= 2018)]
+DEFAULT_PROJECTION = 'natural earth'
+
+# Years of the map, for the slider of the streaming mode
+@data.derived('gdp')
+def years(GDPMap):
+    return sorted(int(year) for year in GDPMap['Year'].unique() if 1950 <= year <= 2018)
+
+FRAMES_URL = '/gdp-map/frames'
 
 def gdp_map_layout():
     return html.Div([
@@ -17,7 +32,7 @@ def gdp_map_layout():
             html.H2("GDP per Capita World Map"),
             dcc.Dropdown(
                 id='country-search-dropdown',
-                options=[{'label': country, 'value': country} for country in filtered_data['Country'].unique()],
+                options=[{'label': country, 'value': country} for country in gdp_rows()['Country'].unique()],
                 placeholder='Select a country',
                 style={'width': '35%'}  # Make dropdown menu narrower
             ),
@@ -33,71 +48,228 @@ def gdp_map_layout():
             ),
             dcc.Graph(
                 id='gdp-map',
+                figure=prerender.figure('gdp-map' if config.GDP_MAP_STREAMING else 'gdp-map-animated'),
                 style={'width': '50%', 'height': '800px'}  # Make plot wider and taller
-            )
+            ),
+            *(year_controls() if config.GDP_MAP_STREAMING else [])
         ], style={'marginLeft': '-170px', 'width': 'calc(100% - 250px)', 'backgroundColor': '#f5ebe0'})  
     ], style={'display': 'flex', 'backgroundColor': '#f5ebe0'})
 
+# Year slider and play button of the streaming mode. The figure holds one year and the
+# client fetches the others in chunks from FRAMES_URL (assets/gdp_stream.js).
+def year_controls():
+    map_years = years()
+    return [
+        html.Div([
+            html.Button('Play', id='gdp-play-button', n_clicks=0, style={'marginRight': '20px'}),
+            html.Div(
+                dcc.Slider(
+                    id='gdp-year-slider',
+                    min=map_years[0],
+                    max=map_years[-1],
+                    step=1,
+                    value=map_years[-1],
+                    marks={year: str(year) for year in map_years if year % 10 == 0},
+                    updatemode='drag'
+                ),
+                style={'flex': '1'}
+            )
+        ], style={'display': 'flex', 'alignItems': 'center', 'width': '1600px', 'marginTop': '10px'}),
+        dcc.Interval(id='gdp-play-interval', interval=500, disabled=True),
+        dcc.Store(id='gdp-stream-settings', data={
+            'url': FRAMES_URL,
+            'version': data.version('gdp'),
+            'chunk': config.GDP_MAP_CHUNK_YEARS,
+            'first': map_years[0],
+            'last': map_years[-1],
+        })
+    ]
+
+def country_rows(selected_country):
+    filtered_data = gdp_rows()
+    if selected_country:
+        return filtered_data[filtered_data['Country'] == selected_country]
+    return filtered_data
+
+def style_gdp_map(figGDPDash, title):
+    figGDPDash.update_layout(
+        title={
+            'text': title,
+            'y': 0.9,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        },
+        geo=dict(
+            showframe=True,
+            showcoastlines=True,
+            coastlinecolor='black',
+            projection_type=DEFAULT_PROJECTION,
+            bgcolor='#f5ebe0'
+        ),
+        coloraxis_colorbar=dict(
+            title='GDP per capita',
+            tickprefix='$',
+            titlefont=dict(size=14),
+            tickfont=dict(size=12)
+        ),
+        paper_bgcolor='#f5ebe0',
+        plot_bgcolor='#f5ebe0',
+        height=800,
+        width=1600
+    )
+
+# Single-year figure of the streaming mode. The color scale covers every year so the
+# colors keep their meaning when the client swaps in another year.
+@cached_figure('GDP_map_year', datasets=('gdp',))
+def build_gdp_year_map(selected_country, year):
+    rows = country_rows(selected_country)
+    figGDPDash = px.choropleth(
+        rows[rows['Year'] == year],
+        locations='Code',
+        color='GDP per capita',
+        hover_name='Country',
+        range_color=[rows['GDP per capita'].min(), rows['GDP per capita'].max()],
+        projection=DEFAULT_PROJECTION,
+        labels={'GDP per capita': 'GDP per capita ($USD)'}
+    )
+    style_gdp_map(figGDPDash, f'GDP per capita by Country ({year})')
+    # Keeps the zoom and globe rotation when the year changes
+    figGDPDash.update_layout(uirevision='gdp-map')
+    return slim_figure(figGDPDash.to_dict())
+
+# Compact JSON of the map data for the years start..end:
+# {"year": {"locations": [...], "z": [...], "hovertext": [...]}}
+@functools.lru_cache(maxsize=256)
+def _year_chunk(version, start, end, selected_country):
+    rows = country_rows(selected_country)
+    rows = rows[(rows['Year'] >= start) & (rows['Year'] <= end)]
+    chunk = {}
+    for year, group in rows.groupby('Year'):
+        chunk[str(year)] = {
+            'locations': group['Code'].astype(str).tolist(),
+            'z': group['GDP per capita'].astype('float64').round(2).tolist(),
+            'hovertext': group['Country'].astype(str).tolist(),
+        }
+    return json.dumps(chunk, separators=(',', ':'))
+
+def year_chunk(start, end, selected_country=None):
+    return _year_chunk(data.version('gdp'), start, end, selected_country)
+
+def frames_response():
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    if start is None or end is None or not 0 <= end - start < len(years()):
+        abort(400)
+    response = Response(year_chunk(start, end, request.args.get('country') or None), mimetype='application/json')
+    # The client puts the dataset version in the URL, so a chunk never changes
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+# The animated figure for a country filter (None for all countries) is built once and
+# cached, the projection is applied per request
+@cached_figure('GDP_map', datasets=('gdp',))
+def build_gdp_map(selected_country):
+    filtered_data = gdp_rows()
+    # Create animated choropleth map
+    if selected_country:
+        filtered_country_data = filtered_data[filtered_data['Country'] == selected_country]
+        figGDPDash = px.choropleth(
+            filtered_country_data,  # Use the filtered dataset for animation
+            locations='Code',  # Use 'Code' as the identifier for countries
+            color='GDP per capita',
+            animation_frame='Year',  # Animate over years
+            hover_name='Country',  # Label countries on hover
+            range_color=[filtered_country_data['GDP per capita'].min(), filtered_country_data['GDP per capita'].max()],  # Adjust color scale
+            projection=DEFAULT_PROJECTION,  # The callback applies the selected projection
+            title=f'GDP per capita of {selected_country} (1950-2018)',
+            labels={'GDP per capita': 'GDP per capita ($USD)'}
+        )
+    else:
+        figGDPDash = px.choropleth(
+            filtered_data,  # Use the full dataset for animation
+            locations='Code',  # Use 'Code' as the identifier for countries
+            color='GDP per capita',
+            animation_frame='Year',  # Animate over years
+            hover_name='Country',  # Label countries on hover
+            range_color=[filtered_data['GDP per capita'].min(), filtered_data['GDP per capita'].max()],  # Adjust color scale
+            projection=DEFAULT_PROJECTION,  # The callback applies the selected projection
+            title='GDP per capita by Country (1950-2018)',
+            labels={'GDP per capita': 'GDP per capita ($USD)'}
+        )
+    
+    # Update layout to match the example
+    style_gdp_map(figGDPDash, 'GDP per capita by Country (1950-2018)')
+
+    return slim_figure(figGDPDash.to_dict())
+
+# What the callbacks return for the page's initial values, shipped in the layout
+def default_figure():
+    return with_projection(build_gdp_year_map(None, years()[-1]), DEFAULT_PROJECTION)
+
+def default_animated_figure():
+    return with_projection(build_gdp_map(None), DEFAULT_PROJECTION)
+
+# The layout already holds the default figure, so the callbacks have no initial call
 def register_callbacks(app):
+    if config.GDP_MAP_STREAMING:
+        register_streaming_callbacks(app)
+        return
+
+    # A projection change is made in the browser, only a new country goes to the server
     @app.callback(
         Output('gdp-map', 'figure'),
-        [Input('country-search-dropdown', 'value'),
-         Input('projection-dropdown', 'value')]
+        [Input('country-search-dropdown', 'value')],
+        [State('projection-dropdown', 'value')],
+        prevent_initial_call=True
     )
     def update_map(selected_country, selected_projection):
-        # Create animated choropleth map
-        if selected_country:
-            filtered_country_data = filtered_data[filtered_data['Country'] == selected_country]
-            figGDPDash = px.choropleth(
-                filtered_country_data,  # Use the filtered dataset for animation
-                locations='Code',  # Use 'Code' as the identifier for countries
-                color='GDP per capita',
-                animation_frame='Year',  # Animate over years
-                hover_name='Country',  # Label countries on hover
-                range_color=[filtered_country_data['GDP per capita'].min(), filtered_country_data['GDP per capita'].max()],  # Adjust color scale
-                projection=selected_projection,  # Apply the selected projection type
-                title=f'GDP per capita of {selected_country} (1950-2018)',
-                labels={'GDP per capita': 'GDP per capita ($USD)'}
-            )
-        else:
-            figGDPDash = px.choropleth(
-                filtered_data,  # Use the full dataset for animation
-                locations='Code',  # Use 'Code' as the identifier for countries
-                color='GDP per capita',
-                animation_frame='Year',  # Animate over years
-                hover_name='Country',  # Label countries on hover
-                range_color=[filtered_data['GDP per capita'].min(), filtered_data['GDP per capita'].max()],  # Adjust color scale
-                projection=selected_projection,  # Apply the selected projection type
-                title='GDP per capita by Country (1950-2018)',
-                labels={'GDP per capita': 'GDP per capita ($USD)'}
-            )
-        
-        # Update layout to match the example
-        figGDPDash.update_layout(
-            title={
-                'text': 'GDP per capita by Country (1950-2018)',
-                'y': 0.9,
-                'x': 0.5,
-                'xanchor': 'center',
-                'yanchor': 'top'
-            },
-            geo=dict(
-                showframe=True,
-                showcoastlines=True,
-                coastlinecolor='black',
-                projection_type=selected_projection,  # Apply the selected projection type
-                bgcolor='#f5ebe0'
-            ),
-            coloraxis_colorbar=dict(
-                title='GDP per capita',
-                tickprefix='$',
-                titlefont=dict(size=14),
-                tickfont=dict(size=12)
-            ),
-            paper_bgcolor='#f5ebe0',
-            plot_bgcolor='#f5ebe0',
-            height=800,
-            width=1600
-        )
+        return with_projection(build_gdp_map(selected_country), selected_projection)
+
+    register_projection_toggle(app, 'gdp-map', 'projection-dropdown')
+
 
-        return figGDPDash
+def register_streaming_callbacks(app):
+    app.server.add_url_rule(FRAMES_URL, 'gdp_map_frames', frames_response)
+
+    # A new country starts again from the latest year
+    @app.callback(
+        [Output('gdp-map', 'figure'),
+         Output('gdp-year-slider', 'value')],
+        [Input('country-search-dropdown', 'value')],
+        [State('projection-dropdown', 'value')],
+        prevent_initial_call=True
+    )
+    def update_map(selected_country, selected_projection):
+        last_year = years()[-1]
+        figure = build_gdp_year_map(selected_country, last_year)
+        return with_projection(figure, selected_projection), last_year
+
+    register_projection_toggle(app, 'gdp-map', 'projection-dropdown')
+
+    # The year is changed in the browser, from the chunks fetched from FRAMES_URL
+    app.clientside_callback(
+        ClientsideFunction(namespace='gdp_map', function_name='show_year'),
+        Output('gdp-map', 'figure', allow_duplicate=True),
+        Input('gdp-year-slider', 'value'),
+        State('gdp-map', 'figure'),
+        State('country-search-dropdown', 'value'),
+        State('gdp-stream-settings', 'data'),
+        prevent_initial_call=True
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='gdp_map', function_name='toggle_play'),
+        [Output('gdp-play-interval', 'disabled'),
+         Output('gdp-play-button', 'children')],
+        Input('gdp-play-button', 'n_clicks'),
+        State('gdp-play-interval', 'disabled'),
+        prevent_initial_call=True
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='gdp_map', function_name='next_year'),
+        Output('gdp-year-slider', 'value', allow_duplicate=True),
+        Input('gdp-play-interval', 'n_intervals'),
+        State('gdp-year-slider', 'value'),
+        State('gdp-stream-settings', 'data'),
+        prevent_initial_call=True
+    )
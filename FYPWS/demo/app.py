@@ -1,19 +1,32 @@
 from dash import Dash, dcc, html
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output
+from flask import jsonify
+import os
 
-# Import your layout functions and callbacks
-from home import home_layout, update_graph
-from mpi_map import mpi_map_layout, register_callbacks as mpi_register_callbacks
-from salary_map import salary_map_layout, register_callbacks as salary_register_callbacks
-from income_map import income_map_layout, register_callbacks as income_register_callbacks
-from GDP_map import gdp_map_layout, register_callbacks as gdp_register_callbacks
-from forecast import forecasting_layout, register_forecasting_callbacks
-from incomeforecast import incForecasting_layout, inc_register_forecasting_callbacks 
+# Import the page registry and the home page callback, the pages load their data on first use
+from home import update_graph
+import pages
 from sidebar import sidebar
+from jobs import background_manager
+import compression
+import config
+import data
+import data_api
+import metrics
 
-# Initialize the app
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
+# Initialize the app, forecast callbacks run as background jobs on the local job queue
+app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True,
+           background_callback_manager=background_manager)
+
+# Per-callback timings, response sizes and cache status on /metrics; must wrap
+# app.callback before any callback is registered
+if config.METRICS:
+    metrics.instrument(app)
+
+# gzip/brotli for the callback responses, figures and JS bundles
+if config.COMPRESS:
+    compression.register(app.server)
 
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
@@ -24,12 +37,10 @@ app.layout = html.Div([
 ], style={'backgroundColor': '#f5ebe0'})
 
 # Register callbacks for each page
-mpi_register_callbacks(app)
-salary_register_callbacks(app)
-income_register_callbacks(app)
-gdp_register_callbacks(app)
-register_forecasting_callbacks(app)
-inc_register_forecasting_callbacks(app)
+pages.register_callbacks(app)
+
+# Load the pages listed in FYP_PRELOAD_PAGES now rather than on their first request
+pages.preload()
 
 # Callback to navigate between pages
 @app.callback(
@@ -37,29 +48,31 @@ inc_register_forecasting_callbacks(app)
     [Input('url', 'pathname')]
 )
 def display_page(pathname):
-    if pathname == '/salary-map':
-        return salary_map_layout()
-    elif pathname == '/mpi-map':
-        return mpi_map_layout()
-    elif pathname == '/income-map':
-        return income_map_layout()
-    elif pathname == '/gdp-map':
-        return gdp_map_layout()
-    elif pathname == '/forecasting':
-        return forecasting_layout()
-    elif pathname == '/incForecasting':
-        return incForecasting_layout()
-    else:
-        return home_layout()
+    return pages.layout(pathname)
 
-# Define the callback to update the graph based on the selected metric
+# Define the callback to update the graph based on the selected metric. The home layout
+# already holds the default metric's plot, so there is no initial call.
 @app.callback(
     Output('bar-plot', 'figure'),
-    [Input('metric-dropdown', 'value')]
+    [Input('metric-dropdown', 'value')],
+    prevent_initial_call=True
 )
 def update_graph_callback(selected_metric):
     return update_graph(selected_metric)
 
+# Read-only JSON/Arrow API over the datasets, for the downstream jobs (see data_api.py)
+data_api.register(app.server)
+
+# Health check for the load balancer: which datasets this worker has loaded, and their versions
+@app.server.route('/healthz')
+def healthz():
+    return jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'datasets': {name: data.version(name) for name in data.loaded()},
+        'not_loaded': sorted(set(data.DATASETS) - set(data.loaded())),
+    })
+
 # Run the app
 if __name__ == '__main__':
     app.run_server(debug=True)
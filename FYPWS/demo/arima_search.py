@@ -0,0 +1,188 @@
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import config
+
+# The 3x3x3 grid of (p, d, q) orders searched for every country
+CANDIDATE_ORDERS = list(itertools.product(range(0, 3), range(0, 3), range(0, 3)))
+
+MAX_WORKERS = config.SEARCH_WORKERS
+
+# Defaults of every search: seconds before a running fit counts as failed, and finished
+# fits in a row without a new best AIC before the search stops (None: no limit)
+FIT_TIMEOUT = config.SEARCH_FIT_TIMEOUT or None
+PATIENCE = config.SEARCH_PATIENCE or None
+
+_pool = None
+# Queue a worker of a search's own pool reports (order, pid, start time) to when it
+# starts a fit, None in other workers
+_started = None
+
+
+# Import statsmodels once per worker so the first fit in each process is not slowed down
+def _init_worker(started=None):
+    global _started
+    _started = started
+    import statsmodels.api  # noqa: F401
+
+
+def _fit_order(values, order):
+    import statsmodels.api as sm
+
+    if _started is not None:
+        _started.put((order, os.getpid(), time.monotonic()))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = sm.tsa.ARIMA(values, order=order).fit()
+    return float(results.aic)
+
+
+# One pool per process, created on first use and reused by every search without a fit
+# timeout and by the backtests
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=_init_worker)
+    return _pool
+
+
+# Pool of a single search with a fit timeout, whose workers report when each fit starts.
+# A timed out fit is stopped by terminating its worker, so the pool is not shared.
+# Importing statsmodels here first lets forked workers start with it already loaded.
+def search_pool(started):
+    import statsmodels.api  # noqa: F401
+
+    return ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=_init_worker, initargs=(started,))
+
+
+def _terminate(pid):
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        pass  # the fit finished and its worker exited meanwhile
+
+
+class SearchResult:
+    def __init__(self, ranked, failed, skipped, elapsed):
+        self.ranked = ranked      # [(order, aic)] sorted by AIC
+        self.failed = failed      # [(order, reason)]
+        self.skipped = skipped    # orders never fitted because of early stopping
+        self.elapsed = elapsed
+
+    @property
+    def best_order(self):
+        if not self.ranked:
+            return None
+        return self.ranked[0][0]
+
+    @property
+    def stopped_early(self):
+        return bool(self.skipped)
+
+    def aic_table(self):
+        return [[list(order), aic] for order, aic in self.ranked]
+
+
+# Fit the candidate ARIMA orders in parallel and rank them by AIC.
+# `fit_timeout` (seconds) marks a fit as failed once it has run that long in a worker,
+# `patience` stops the search after that many finished fits in a row without a new best
+# AIC (both default to FYP_SEARCH_FIT_TIMEOUT and FYP_SEARCH_PATIENCE), and
+# `progress(done, total)` is called after every finished fit.
+# With a fit timeout the search runs on a pool of its own; fits on a caller's `executor`
+# are never timed out, as the search cannot stop the caller's workers.
+def search_orders(series, orders=None, fit_timeout=FIT_TIMEOUT, patience=PATIENCE, progress=None, executor=None):
+    orders = list(CANDIDATE_ORDERS if orders is None else orders)
+    values = np.asarray(series, dtype=np.float64).ravel()
+    started = None
+    if executor is not None:
+        pool = executor
+        fit_timeout = None
+    elif fit_timeout:
+        started = multiprocessing.Queue()
+        pool = search_pool(started)
+    else:
+        pool = get_pool()
+    start = time.perf_counter()
+
+    pending = {pool.submit(_fit_order, values, order): order for order in orders}
+    running = {}  # order -> (worker pid, start time) of fits a worker has started
+    ranked, failed = [], []
+    best_aic = math.inf
+    since_best = 0
+
+    while pending:
+        done, _ = wait(pending, timeout=0.1 if fit_timeout else None, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            order = pending.pop(future)
+            try:
+                aic = future.result()
+            except Exception as e:
+                failed.append((order, f"{type(e).__name__}: {e}"))
+            else:
+                if not math.isfinite(aic):
+                    failed.append((order, "non-finite AIC"))
+                else:
+                    ranked.append((order, aic))
+                    if aic < best_aic:
+                        best_aic = aic
+                        since_best = 0
+                    else:
+                        since_best += 1
+            if progress is not None:
+                progress(len(orders) - len(pending), len(orders))
+
+        if fit_timeout:
+            while True:
+                try:
+                    order, pid, since = started.get_nowait()
+                except queue.Empty:
+                    break
+                running[order] = (pid, since)
+            now = time.monotonic()
+            stuck = []  # worker pids of timed out fits
+            for future, order in list(pending.items()):
+                if order in running and now - running[order][1] > fit_timeout:
+                    del pending[future]
+                    failed.append((order, f"timed out after {fit_timeout}s"))
+                    stuck.append(running[order][0])
+            # A running fit cannot be interrupted and keeps its worker busy, so the
+            # workers of timed out fits are terminated. That breaks the pool: the fits
+            # not finished yet move to a fresh one.
+            if stuck:
+                retry = [(future, order) for future, order in pending.items() if not future.done()]
+                pool.shutdown(wait=False, cancel_futures=True)
+                for pid in stuck:
+                    _terminate(pid)
+                started.close()
+                started = multiprocessing.Queue()
+                pool = search_pool(started)
+                running.clear()
+                for future, order in retry:
+                    del pending[future]
+                    pending[pool.submit(_fit_order, values, order)] = order
+
+        if patience is not None and ranked and since_best >= patience:
+            break
+
+    skipped = []
+    for future, order in pending.items():
+        future.cancel()
+        skipped.append(order)
+
+    if started is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        started.close()
+
+    ranked.sort(key=lambda x: x[1])
+    return SearchResult(ranked, failed, skipped, time.perf_counter() - start)
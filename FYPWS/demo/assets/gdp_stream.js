@@ -0,0 +1,58 @@
+// Streaming mode of the GDP world map (GDP_map.py). The figure holds a single year;
+// the other years are fetched in chunks from the frames endpoint and swapped into it.
+var gdpChunks = {};
+var gdpLatestRequest = 0;
+
+// Promise of the chunk holding `year`, fetched at most once per country
+function gdpChunk(settings, country, year) {
+    var start = settings.first + Math.floor((year - settings.first) / settings.chunk) * settings.chunk;
+    var end = Math.min(start + settings.chunk - 1, settings.last);
+    var key = settings.version + '|' + (country || '') + '|' + start;
+    if (!(key in gdpChunks)) {
+        var params = new URLSearchParams({start: start, end: end, v: settings.version});
+        if (country) {
+            params.set('country', country);
+        }
+        gdpChunks[key] = fetch(settings.url + '?' + params.toString()).then(function (response) {
+            if (!response.ok) {
+                throw new Error('GDP frames request failed: ' + response.status);
+            }
+            return response.json();
+        });
+        gdpChunks[key].catch(function () {
+            delete gdpChunks[key];
+        });
+    }
+    return gdpChunks[key];
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    gdp_map: {
+        show_year: async function (year, figure, country, settings) {
+            var request = ++gdpLatestRequest;
+            var chunk = await gdpChunk(settings, country, year);
+            // Fetch the next chunk ahead of the slider or the play button
+            if (year + settings.chunk <= settings.last) {
+                gdpChunk(settings, country, year + settings.chunk).catch(function () {});
+            }
+            // A later year was asked for while this chunk was loading
+            if (request !== gdpLatestRequest || !figure) {
+                return window.dash_clientside.no_update;
+            }
+            var frame = chunk[String(year)] || {locations: [], z: [], hovertext: []};
+            var trace = Object.assign({}, figure.data[0], frame);
+            var title = Object.assign({}, figure.layout.title, {text: 'GDP per capita by Country (' + year + ')'});
+            var layout = Object.assign({}, figure.layout, {title: title});
+            return Object.assign({}, figure, {data: [trace], layout: layout});
+        },
+
+        toggle_play: function (n_clicks, disabled) {
+            return disabled ? [false, 'Pause'] : [true, 'Play'];
+        },
+
+        // Advance one year, starting over after the last one
+        next_year: function (n_intervals, year, settings) {
+            return year >= settings.last ? settings.first : year + 1;
+        }
+    }
+});
@@ -0,0 +1,33 @@
+// Projection and MPI map-type toggles of the map pages (figures.py, mpi_map.py).
+// Both only change the figure already in the browser.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    maps: {
+        set_projection: function (projection, figure) {
+            if (!projection || !figure) {
+                return window.dash_clientside.no_update;
+            }
+            var geo = Object.assign({}, figure.layout.geo);
+            geo.projection = Object.assign({}, geo.projection, {type: projection});
+            var layout = Object.assign({}, figure.layout, {geo: geo});
+            return Object.assign({}, figure, {layout: layout});
+        },
+
+        // The marker sizes, colors and titles of every map type are in layout.meta
+        set_map_type: function (mapType, figure) {
+            var meta = figure && figure.layout.meta;
+            var variant = meta && meta.map_types && meta.map_types[mapType];
+            if (!variant || !figure.data.length) {
+                return window.dash_clientside.no_update;
+            }
+            var trace = Object.assign({}, figure.data[0], {hovertemplate: variant.hovertemplate});
+            trace.marker = Object.assign({}, trace.marker, {
+                size: variant.size,
+                color: variant.color,
+                sizeref: variant.sizeref
+            });
+            var title = Object.assign({}, figure.layout.title, {text: variant.title});
+            var layout = Object.assign({}, figure.layout, {title: title});
+            return Object.assign({}, figure, {data: [trace].concat(figure.data.slice(1)), layout: layout});
+        }
+    }
+});
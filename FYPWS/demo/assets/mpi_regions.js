@@ -0,0 +1,26 @@
+// Sub-national region dropdown of the MPI map (mpi_map.py). The options of every
+// country are fetched once from the URL the layout puts in the mpi-regions-settings store.
+var mpiRegionOptions = null;
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    mpi_map: {
+        region_options: async function (country, settings) {
+            if (!country) {
+                return [];
+            }
+            if (mpiRegionOptions === null) {
+                mpiRegionOptions = fetch(settings.url).then(function (response) {
+                    if (!response.ok) {
+                        throw new Error('MPI regions request failed: ' + response.status);
+                    }
+                    return response.json();
+                });
+                mpiRegionOptions.catch(function () {
+                    mpiRegionOptions = null;
+                });
+            }
+            var options = await mpiRegionOptions;
+            return options[country] || [];
+        }
+    }
+});
@@ -0,0 +1,357 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import arima_search
+import batch_forecast
+import config
+import data
+import model_select
+from forecast_store import prepare_series
+
+# Rolling-origin backtests of the forecast models.
+#
+# For every country, the last ORIGINS positions of its series that leave HORIZON observed
+# values after them are cutoffs: each model is fitted on the values up to the cutoff and
+# its forecasts for the next HORIZON observations are compared with the actual values.
+# Models:
+#   arima     the GDP forecast's grid search (FYP_FORECAST_SEARCH=grid): every order of
+#             the ARIMA grid is fitted and the one with the lowest AIC forecasts
+#   stepwise  the GDP forecast's default selection: exponential smoothing and drift
+#             baselines, then a stepwise ARIMA search (model_select.py)
+#   poly2     the income forecast page's model: a degree-2 polynomial trend, fitted with
+#             batch_forecast.fit_all for all windows with the same training years at once
+#   naive     the last observed value, as a reference
+#
+# ARIMA grid fits run on a process pool, one task per (country, cutoff, order), and
+# stepwise selections one task per (country, cutoff). The AIC and forecast of every grid
+# fit, and the forecast of every selection, are kept in a diskcache directory
+# (BACKTEST_CACHE) keyed by the training values, the order and the horizon, so a rerun
+# only fits the windows whose data changed. The error of every forecast, the MAE/MAPE
+# tables by model and horizon step and by model and country, and the fit throughput are
+# written to BACKTEST_DIR.
+
+MODELS = ('arima', 'stepwise', 'poly2', 'naive')
+
+# Dataset -> (series of a country as (years, values), default horizon, default origins)
+DATASETS = {
+    'gdp': ('gdp', 5, 5),
+    'income': ('income', 3, 3),
+}
+
+MIN_TRAIN = 8
+
+
+def gdp_series(GDPdata, country):
+    series = prepare_series(GDPdata, country)
+    return series.index.to_numpy(dtype=np.int64), series['GDP per capita'].to_numpy(dtype=np.float64)
+
+
+# Non-zero income values of a country, as the income forecast page fits them
+def income_series(incomeMap, country):
+    rows = incomeMap[(incomeMap['Country'] == country) & (incomeMap['Value'] != 0)].sort_values('Year')
+    return rows['Year'].to_numpy(dtype=np.int64), rows['Value'].to_numpy(dtype=np.float64)
+
+
+SERIES = {'gdp': gdp_series, 'income': income_series}
+
+
+class Window:
+    def __init__(self, country, years, values, cut, horizon):
+        self.country = country
+        self.train_years = years[:cut]
+        self.train_values = values[:cut]
+        self.test_years = years[cut:cut + horizon]
+        self.test_values = values[cut:cut + horizon]
+
+    @property
+    def cutoff(self):
+        return int(self.train_years[-1])
+
+    # Identifies the training data, whatever the country is called
+    @property
+    def digest(self):
+        return hashlib.sha256(self.train_values.tobytes()).hexdigest()[:32]
+
+
+# Rolling-origin windows of every country with at least `min_train` training values
+def windows(dataset, countries=None, horizon=None, origins=None, min_train=MIN_TRAIN):
+    name, default_horizon, default_origins = DATASETS[dataset]
+    horizon = horizon or default_horizon
+    origins = origins or default_origins
+    frame = data.get(name)
+    if countries is None:
+        countries = frame['Country'].unique()
+    result = []
+    for country in countries:
+        years, values = SERIES[dataset](frame, country)
+        last_cut = len(values) - horizon
+        for cut in range(max(last_cut - origins + 1, min_train), last_cut + 1):
+            result.append(Window(country, years, values, cut, horizon))
+    return result
+
+
+def _fit_arima(values, order, horizon):
+    import statsmodels.api as sm
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = sm.tsa.ARIMA(values, order=order).fit()
+    return float(results.aic), [float(v) for v in np.asarray(results.forecast(horizon))]
+
+
+def cache_key(window, order, horizon):
+    return f"arima|{window.digest}|{''.join(map(str, order))}|{horizon}"
+
+
+# Fit every order of the grid on every window, on the pool. Returns the forecast of the
+# lowest-AIC order of each window (None when no order could be fitted) and fit counts.
+def arima_forecasts(windows, horizon, orders=None, executor=None, cache=None):
+    orders = list(arima_search.CANDIDATE_ORDERS if orders is None else orders)
+    pool = executor or arima_search.get_pool()
+    start = time.perf_counter()
+
+    fits = {}  # (window index, order) -> {'aic', 'forecast'} or {'error'}
+    pending = {}
+    cached = 0
+    for i, window in enumerate(windows):
+        for order in orders:
+            key = cache_key(window, order, horizon)
+            fit = cache.get(key) if cache is not None else None
+            if fit is not None:
+                fits[(i, order)] = fit
+                cached += 1
+            else:
+                future = pool.submit(_fit_arima, window.train_values, order, horizon)
+                pending[future] = (i, order, key)
+
+    for future in as_completed(pending):
+        i, order, key = pending[future]
+        try:
+            aic, forecast = future.result()
+            fit = {'aic': aic, 'forecast': forecast} if np.isfinite(aic) else {'error': 'non-finite AIC'}
+        except Exception as e:
+            fit = {'error': f"{type(e).__name__}: {e}"}
+        fits[(i, order)] = fit
+        if cache is not None:
+            cache.set(key, fit)
+
+    forecasts = []
+    for i in range(len(windows)):
+        ranked = sorted((fits[(i, order)]['aic'], order) for order in orders if 'aic' in fits[(i, order)])
+        if ranked:
+            order = ranked[0][1]
+            forecasts.append((f"ARIMA({','.join(map(str, order))})", fits[(i, order)]['forecast']))
+        else:
+            forecasts.append((None, None))
+
+    stats = {
+        'fits': len(pending),
+        'cached': cached,
+        'failed': sum('error' in fit for fit in fits.values()),
+        'seconds': time.perf_counter() - start,
+    }
+    return forecasts, stats
+
+
+def _select(values, horizon):
+    selection = model_select.select_model(values)
+    forecast = selection.forecast(horizon)[0]
+    return {'model': selection.best.label, 'fits': selection.fits, 'forecast': [float(v) for v in forecast]}
+
+
+# Stepwise model selection on every window, on the pool
+def stepwise_forecasts(windows, horizon, executor=None, cache=None):
+    pool = executor or arima_search.get_pool()
+    start = time.perf_counter()
+
+    selections = {}
+    pending = {}
+    for i, window in enumerate(windows):
+        key = f"stepwise|{window.digest}|{horizon}|{model_select.BASELINE_MARGIN}"
+        selection = cache.get(key) if cache is not None else None
+        if selection is not None:
+            selections[i] = selection
+        else:
+            pending[pool.submit(_select, window.train_values, horizon)] = (i, key)
+
+    fits = failed = 0
+    for future in as_completed(pending):
+        i, key = pending[future]
+        try:
+            selection = future.result()
+        except Exception:
+            failed += 1
+            continue
+        fits += selection['fits']
+        selections[i] = selection
+        if cache is not None:
+            cache.set(key, selection)
+
+    forecasts = [(selections[i]['model'], selections[i]['forecast']) if i in selections else (None, None)
+                 for i in range(len(windows))]
+    stats = {
+        'fits': fits,
+        'cached': len(windows) - len(pending),
+        'failed': failed,
+        'seconds': time.perf_counter() - start,
+    }
+    return forecasts, stats
+
+
+# Degree-2 polynomial forecasts of every window, one fit_all call per set of training years
+def poly2_forecasts(windows, horizon):
+    # Imported by fit_all on first use, kept out of the timing
+    from scipy import stats  # noqa: F401
+
+    start = time.perf_counter()
+    groups = {}
+    for i, window in enumerate(windows):
+        groups.setdefault(tuple(window.train_years), []).append(i)
+
+    forecasts = [None] * len(windows)
+    for years, members in groups.items():
+        years = np.asarray(years, dtype=np.float64)
+        result = batch_forecast.fit_all(years, np.stack([windows[i].train_values for i in members]),
+                                        degree=2, steps=horizon)
+        # Evaluated at the observed test years, which skip the years with no data
+        for i, coef in zip(members, result['coef']):
+            X = batch_forecast.design(windows[i].test_years, years.mean(), 2)
+            forecasts[i] = (None, list(X @ coef))
+    stats = {'fits': len(windows), 'cached': 0, 'failed': 0, 'seconds': time.perf_counter() - start}
+    return forecasts, stats
+
+
+def naive_forecasts(windows, horizon):
+    forecasts = [(None, [float(window.train_values[-1])] * horizon) for window in windows]
+    return forecasts, {'fits': len(windows), 'cached': 0, 'failed': 0, 'seconds': 0.0}
+
+
+# One row per forecast value: dataset, model, country, cutoff, model selected at the cutoff,
+# step, year, actual, forecast, absolute and absolute percentage errors
+ERROR_COLUMNS = ['dataset', 'model', 'country', 'cutoff', 'selected', 'step', 'year', 'actual',
+                 'forecast', 'abs_error', 'ape']
+
+
+def error_rows(dataset, model, windows, forecasts):
+    rows = []
+    for window, (selected, forecast) in zip(windows, forecasts):
+        if forecast is None:
+            continue
+        for step, (year, actual, predicted) in enumerate(zip(window.test_years, window.test_values, forecast), 1):
+            rows.append({
+                'dataset': dataset,
+                'model': model,
+                'country': window.country,
+                'cutoff': window.cutoff,
+                'selected': selected or '',
+                'step': step,
+                'year': int(year),
+                'actual': float(actual),
+                'forecast': float(predicted),
+                'abs_error': abs(predicted - actual),
+                'ape': abs(predicted - actual) / abs(actual) * 100 if actual else np.nan,
+            })
+    return rows
+
+
+# MAE and MAPE (%) of the errors grouped by `by`. Groups in `groups` without a forecast
+# (every window too short or failed) get a row of 0 forecasts and NaN errors.
+def error_table(errors, by, groups=None):
+    table = errors.groupby(by, sort=True).agg(
+        forecasts=('abs_error', 'size'), MAE=('abs_error', 'mean'), MAPE=('ape', 'mean'))
+    if groups is not None:
+        table = table.reindex(pd.MultiIndex.from_tuples(groups, names=by))
+        table['forecasts'] = table['forecasts'].fillna(0).astype(int)
+    return table.reset_index()
+
+
+def run(datasets=('gdp', 'income'), models=MODELS, countries=None, horizon=None, origins=None,
+        min_train=MIN_TRAIN, executor=None, cache_dir=config.BACKTEST_CACHE,
+        output_dir=config.BACKTEST_DIR, verbose=False):
+    import diskcache
+
+    cache = diskcache.Cache(cache_dir) if cache_dir else None
+    errors = []
+    throughput = {}
+    try:
+        for dataset in datasets:
+            dataset_windows = windows(dataset, countries, horizon, origins, min_train)
+            dataset_horizon = horizon or DATASETS[dataset][1]
+            for model in models:
+                if model == 'arima':
+                    forecasts, stats = arima_forecasts(dataset_windows, dataset_horizon, executor=executor,
+                                                       cache=cache)
+                elif model == 'stepwise':
+                    forecasts, stats = stepwise_forecasts(dataset_windows, dataset_horizon, executor=executor,
+                                                          cache=cache)
+                elif model == 'poly2':
+                    forecasts, stats = poly2_forecasts(dataset_windows, dataset_horizon)
+                else:
+                    forecasts, stats = naive_forecasts(dataset_windows, dataset_horizon)
+                stats['windows'] = len(dataset_windows)
+                stats['fits_per_second'] = stats['fits'] / stats['seconds'] if stats['seconds'] else None
+                throughput[f"{dataset}/{model}"] = stats
+                errors.extend(error_rows(dataset, model, dataset_windows, forecasts))
+                if verbose:
+                    print(f"{dataset}/{model}: {len(dataset_windows)} windows, {stats['fits']} fits "
+                          f"({stats['cached']} cached, {stats['failed']} failed) in {stats['seconds']:.1f}s")
+    finally:
+        if cache is not None:
+            cache.close()
+
+    errors = pd.DataFrame(errors, columns=ERROR_COLUMNS)
+    by_step = error_table(errors, ['dataset', 'model', 'step'])
+    by_country = error_table(errors, ['dataset', 'model', 'country'])
+    overall = error_table(errors, ['dataset', 'model'], sorted(tuple(name.split('/')) for name in throughput))
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        errors.to_csv(os.path.join(output_dir, 'errors.csv'), index=False, float_format='%.8g')
+        by_step.to_csv(os.path.join(output_dir, 'errors_by_step.csv'), index=False, float_format='%.8g')
+        by_country.to_csv(os.path.join(output_dir, 'errors_by_country.csv'), index=False, float_format='%.8g')
+        overall.to_csv(os.path.join(output_dir, 'summary.csv'), index=False, float_format='%.8g')
+        with open(os.path.join(output_dir, 'throughput.json'), 'w', encoding='utf-8') as f:
+            json.dump(throughput, f, indent=2)
+    return {'errors': errors, 'by_step': by_step, 'by_country': by_country, 'summary': overall,
+            'throughput': throughput}
+
+
+# python backtest.py [--dataset gdp] [--model arima] [--country Chile] [--horizon 5] [--origins 5]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rolling-origin backtests of the forecast models')
+    parser.add_argument('--dataset', action='append', choices=sorted(DATASETS), help='(repeatable, default: all)')
+    parser.add_argument('--model', action='append', choices=MODELS, help='(repeatable, default: all)')
+    parser.add_argument('--country', action='append', help='(repeatable, default: every country)')
+    parser.add_argument('--horizon', type=int, help='forecast steps scored at each cutoff (default: gdp 5, income 3)')
+    parser.add_argument('--origins', type=int, help='cutoffs per country (default: gdp 5, income 3)')
+    parser.add_argument('--min-train', type=int, default=MIN_TRAIN, help=f'fewest training values (default: {MIN_TRAIN})')
+    parser.add_argument('--workers', type=int, help=f'processes fitting ARIMA models (default: {config.SEARCH_WORKERS})')
+    parser.add_argument('--no-cache', action='store_true', help='refit every model instead of reusing cached fits')
+    args = parser.parse_args()
+
+    executor = ProcessPoolExecutor(max_workers=args.workers, initializer=arima_search._init_worker) \
+        if args.workers else None
+    report = run(
+        datasets=args.dataset or sorted(DATASETS),
+        models=args.model or MODELS,
+        countries=args.country,
+        horizon=args.horizon,
+        origins=args.origins,
+        min_train=args.min_train,
+        executor=executor,
+        cache_dir=None if args.no_cache else config.BACKTEST_CACHE,
+        verbose=True,
+    )
+    pd.set_option('display.width', 120)
+    print(report['summary'].to_string(index=False))
+    for name, stats in report['throughput'].items():
+        if stats['fits_per_second']:
+            print(f"{name}: {stats['fits_per_second']:.1f} fits/s")
+    print(f"Wrote the tables to {config.BACKTEST_DIR}")
@@ -0,0 +1,129 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import data
+
+# Polynomial trend forecasts for every country in one vectorized call.
+#
+# Every country in incomeMap.csv has a value for the same years, so the per-country fits
+# are one batched least-squares problem: zero values are masked out (as the income
+# forecast page did), the normal equations of each country are built with einsum and
+# solved together. Years are centered before the polynomial features are taken so the
+# quadratic term stays well conditioned. Forecasts start after each country's last
+# non-zero year; the intervals come from the residual variance and the leverage of
+# each forecast year. Countries with `degree` observations or fewer are fitted with a
+# lower degree (a line through two values, a constant through one) and get no interval.
+# Forecasts below `lower_bound` (e.g. 0 for a share) are clipped and flagged.
+
+
+# Polynomial features of the centered years: shape (..., degree + 1)
+def design(years, center, degree):
+    t = np.asarray(years, dtype=np.float64) - center
+    return t[..., None] ** np.arange(degree + 1)
+
+
+# Fit and forecast every row of `values` (countries x years). Zeros are treated as missing.
+# Returns a dict of arrays: forecast years, forecast, lower and upper (countries x steps),
+# which forecasts were clipped, the number of observations and degree per country and the
+# fitted coefficients (0 above a country's degree).
+def fit_all(years, values, degree=2, steps=10, level=0.95, lower_bound=None):
+    # scipy.stats takes most of a second to import, only pay for it when fitting
+    from scipy import stats
+
+    years = np.asarray(years, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    mask = (values != 0) & ~np.isnan(values)
+    y = np.where(mask, values, 0.0)
+    weights = mask.astype(np.float64)
+
+    center = years.mean()
+    X = design(years, center, degree)
+    n_obs = weights.sum(axis=1)
+    # A polynomial of degree n - 1 at most through n observations: the terms above a
+    # country's degree are masked out of its normal equations, so their coefficients are 0
+    degrees = np.clip(n_obs - 1, 0, degree).astype(np.int64)
+    terms = (np.arange(degree + 1) <= degrees[:, None]).astype(np.float64)
+    # Normal equations of every country at once: A[c] = X' W[c] X, b[c] = X' W[c] y[c]
+    A = np.einsum('cy,yi,yj->cij', weights, X, X) * terms[:, :, None] * terms[:, None, :]
+    b = np.einsum('cy,yi->ci', y, X) * terms
+    # pinv leaves the masked terms at 0 (and every term, for a country with no data)
+    A_inv = np.linalg.pinv(A)
+    coef = np.einsum('cij,cj->ci', A_inv, b)
+
+    dof = n_obs - (degrees + 1)
+    residuals = (y - coef @ X.T) * weights
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = np.where(dof > 0, (residuals ** 2).sum(axis=1) / dof, np.nan)
+
+    # Forecast from the year after each country's last observation
+    last_year = np.where(mask, years, -np.inf).max(axis=1)
+    last_year = np.where(np.isfinite(last_year), last_year, years[-1])
+    future_years = last_year[:, None] + np.arange(1, steps + 1)
+    F = design(future_years, center, degree) * terms[:, None, :]
+    forecast = np.einsum('csi,ci->cs', F, coef)
+
+    # Prediction interval: sigma^2 * (1 + leverage of the forecast year)
+    leverage = np.einsum('csi,cij,csj->cs', F, A_inv, F)
+    critical = stats.t.ppf(0.5 + level / 2, np.where(dof > 0, dof, np.nan))
+    spread = critical[:, None] * np.sqrt(sigma2[:, None] * (1 + leverage))
+    lower, upper = forecast - spread, forecast + spread
+    clipped = np.zeros(forecast.shape, dtype=bool)
+    if lower_bound is not None:
+        clipped = forecast < lower_bound
+        forecast = np.maximum(forecast, lower_bound)
+        lower = np.maximum(lower, lower_bound)
+        upper = np.maximum(upper, lower_bound)
+    return {
+        'years': future_years.astype(np.int64),
+        'forecast': forecast,
+        'lower': lower,
+        'upper': upper,
+        'clipped': clipped,
+        'n_obs': n_obs.astype(np.int64),
+        'degree': degrees,
+        'coef': coef,
+    }
+
+
+# Forecasts for every country of a long frame (label, year, value columns), as a long
+# frame with Country, Year, Value, Lower, Upper and Clipped (forecasts raised to
+# `lower_bound`). Countries without any non-zero value are left out.
+def forecast_frame(df, label='Country', year='Year', value='Value', degree=2, steps=10, level=0.95,
+                   lower_bound=None):
+    table = df.pivot_table(index=label, columns=year, values=value, aggfunc='first', observed=True)
+    result = fit_all(table.columns.to_numpy(), table.to_numpy(), degree=degree, steps=steps, level=level,
+                     lower_bound=lower_bound)
+    keep = result['n_obs'] > 0
+    countries = table.index.to_numpy()[keep]
+    return pd.DataFrame({
+        label: np.repeat(countries, steps),
+        year: result['years'][keep].ravel(),
+        value: result['forecast'][keep].ravel(),
+        'Lower': result['lower'][keep].ravel(),
+        'Upper': result['upper'][keep].ravel(),
+        'Clipped': result['clipped'][keep].ravel(),
+    })
+
+
+_income = {}
+_lock = threading.Lock()
+
+
+# 10-year income forecasts of every country, computed once per version of incomeMap.csv.
+# Inequality in income is a share, so forecasts stop at 0.
+def income_forecasts():
+    version = data.version('income')
+    with _lock:
+        cached = _income.get(version)
+        if cached is None:
+            _income.clear()
+            cached = _income[version] = forecast_frame(data.get('income'), lower_bound=0.0)
+    return cached
+
+
+# Forecast of one country indexed by year, empty if the country has no data
+def country_forecast(country):
+    forecasts = income_forecasts()
+    return forecasts[forecasts['Country'] == country].set_index('Year').drop(columns='Country')
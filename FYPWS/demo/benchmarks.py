@@ -0,0 +1,538 @@
+import argparse
+import base64
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+DEMO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Median and best wall time of `fn` over `repeat` runs, in milliseconds.
+# `setup` runs before every run and is not timed.
+def timeit(fn, repeat=20, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': statistics.median(times), 'best_ms': min(times)}
+
+
+# Peak memory allocated by Python while `fn` runs, in bytes. Measured in a separate run
+# since tracing slows everything down.
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# Size in bytes of a Dash component or figure once serialized for the browser
+def payload_bytes(obj):
+    if hasattr(obj, 'to_plotly_json'):
+        obj = obj.to_plotly_json()
+    return len(json.dumps(obj, cls=PlotlyJSONEncoder).encode('utf-8'))
+
+
+# The matplotlib PNG/base64 rendering the forecast pages used before, kept for comparison
+def render_png(history, forecast, title, y_label):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from dash import html
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    history.plot(ax=ax, label='Historical', color='blue')
+    forecast.plot(ax=ax, label='Forecast', linestyle='--', color='orange')
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel('Year')
+    ax.set_ylabel(y_label)
+    ax.legend()
+    ax.grid(True)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+    buf = BytesIO()
+    plt.savefig(buf, format='png')
+    buf.seek(0)
+    image_base64 = base64.b64encode(buf.read()).decode('utf-8')
+    buf.close()
+    plt.close(fig)
+    return html.Img(src='data:image/png;base64,{}'.format(image_base64))
+
+
+def render_plotly(history, forecast, title, y_label, lower=None, upper=None):
+    from dash import dcc
+    from forecast_figure import build_forecast_figure
+
+    fig = build_forecast_figure(history, forecast, title, y_label, lower=lower, upper=upper)
+    return dcc.Graph(figure=fig)
+
+
+# Forecast chart rendering: PNG/base64 versus native Plotly, for one GDP and one income series.
+# The forecasts are a simple drift extrapolation so only rendering is measured.
+def bench_forecast_render(repeat=20):
+    gdp = pd.read_csv(os.path.join(DEMO_DIR, 'GDPmap.csv'))
+    income = pd.read_csv(os.path.join(DEMO_DIR, 'incomeMap.csv'))
+    cases = {
+        'gdp': (gdp[gdp['Country'] == 'Albania'].set_index('Year')['GDP per capita'], 'GDP per Capita'),
+        'income': (income[income['Country'] == 'Angola'].set_index('Year')['Value'], 'Income Value'),
+    }
+
+    results = {}
+    for name, (history, y_label) in cases.items():
+        last_year = int(history.index[-1])
+        drift = (history.iloc[-1] - history.iloc[0]) / max(len(history) - 1, 1)
+        steps = np.arange(1, 11)
+        forecast = pd.Series(history.iloc[-1] + drift * steps, index=last_year + steps)
+        spread = history.std() * np.sqrt(steps)
+        lower, upper = forecast - 1.96 * spread, forecast + 1.96 * spread
+        title = f'Forecast benchmark ({name})'
+
+        png = timeit(lambda: render_png(history, forecast, title, y_label), repeat)
+        png['payload_bytes'] = payload_bytes(render_png(history, forecast, title, y_label))
+        plotly = timeit(lambda: payload_bytes(render_plotly(history, forecast, title, y_label, lower, upper)), repeat)
+        plotly['payload_bytes'] = payload_bytes(render_plotly(history, forecast, title, y_label, lower, upper))
+        results[name] = {'png': png, 'plotly': plotly}
+    return results
+
+
+# Dataset loading: the per-page pd.read_csv calls the pages used to make (GDP, income and
+# complete_data each read twice), one typed CSV load per dataset through the registry, and
+# the registry reading the memory-mapped Feather cache (when pyarrow is installed)
+def bench_data_load(repeat=5):
+    import data
+
+    page_reads = ['gdp', 'gdp', 'complete', 'complete', 'income', 'income', 'mpi', 'salary']
+
+    def per_page():
+        return [pd.read_csv(data.path(name)) for name in page_reads]
+
+    def registry_csv():
+        return [data.read_csv(name) for name in data.DATASETS]
+
+    def registry_feather():
+        return [data.load(name) for name in data.DATASETS]
+
+    cases = [('per_page_csv', per_page), ('registry_csv', registry_csv)]
+    if data.feather is not None:
+        stale = [name for name in data.DATASETS if not data.cache_is_fresh(name)]
+        if stale:
+            data.convert(stale)
+        cases.append(('registry_feather', registry_feather))
+
+    results = {}
+    for label, fn in cases:
+        result = timeit(fn, repeat)
+        result['memory_bytes'] = int(sum(frame.memory_usage(deep=True).sum() for frame in fn()))
+        results[label] = result
+    return results
+
+
+# Income forecasts for every country: the per-country PolynomialFeatures + LinearRegression
+# loop the income forecast page ran on each click, versus one batched least-squares fit
+def bench_batch_forecast(repeat=5):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import PolynomialFeatures
+    import batch_forecast
+    import data
+
+    income = data.get('income')
+
+    def per_country():
+        forecasts = {}
+        for country, rows in income.groupby('Country', observed=True):
+            rows = rows[rows['Value'] != 0]
+            if rows.empty:
+                continue
+            X = rows['Year'].to_numpy(dtype=np.int64).reshape(-1, 1)
+            poly = PolynomialFeatures(degree=2)
+            model = LinearRegression().fit(poly.fit_transform(X), rows['Value'].to_numpy())
+            future = np.arange(X[-1, 0] + 1, X[-1, 0] + 11).reshape(-1, 1)
+            forecasts[country] = model.predict(poly.transform(future))
+        return forecasts
+
+    def batch():
+        return batch_forecast.forecast_frame(income)
+
+    results = {
+        'countries': int(batch()['Country'].nunique()),
+        'per_country_loop': timeit(per_country, repeat),
+        'batch': timeit(batch, repeat),
+    }
+    results['speedup'] = results['per_country_loop']['median_ms'] / results['batch']['median_ms']
+    return results
+
+
+# GDP world map: the animated figure with every year (built and serialized), versus the
+# streaming mode's first figure holding one year, and the chunks fetched afterwards.
+# Only the first figure is needed for the first paint.
+def bench_gdp_stream(repeat=5):
+    import GDP_map
+    from figure_cache import cache
+
+    def serialized(fn):
+        def run():
+            cache.clear()
+            return payload_bytes(fn())
+        return run
+
+    chunk = GDP_map.config.GDP_MAP_CHUNK_YEARS
+    years = GDP_map.years()
+    starts = range(years[0], years[-1] + 1, chunk)
+    chunks = [GDP_map.year_chunk(start, start + chunk - 1) for start in starts]
+    results = {
+        'years': len(years),
+        'animated': timeit(serialized(lambda: GDP_map.build_gdp_map(None)), repeat),
+        'streamed_first_year': timeit(serialized(lambda: GDP_map.build_gdp_year_map(None, years[-1])), repeat),
+        'chunks': {'count': len(chunks), 'total_bytes': sum(len(body) for body in chunks),
+                   'max_bytes': max(len(body) for body in chunks)},
+    }
+    results['animated']['payload_bytes'] = payload_bytes(GDP_map.build_gdp_map(None))
+    results['streamed_first_year']['payload_bytes'] = payload_bytes(GDP_map.build_gdp_year_map(None, years[-1]))
+    return results
+
+
+# Bytes sent for the map figures before and after slim_figure (frames without repeated
+# data, rounded numbers, typed arrays), raw and compressed as the server would send them
+def bench_payloads(repeat=None):
+    import compression
+    import config
+    import GDP_map
+    import income_map
+    import mpi_map
+    from figure_cache import cache
+
+    figures = {
+        'gdp-map': lambda: GDP_map.build_gdp_year_map(None, GDP_map.years()[-1]),
+        'gdp-map-animated': lambda: GDP_map.build_gdp_map(None),
+        'income-map': lambda: income_map.build_income_map(None),
+        'mpi-map': lambda: mpi_map.build_mpi_map(None, None),
+    }
+    encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+    slim = config.FIGURE_SLIM
+    results = {}
+    try:
+        for name, build in figures.items():
+            results[name] = {}
+            for label, enabled in [('before', False), ('after', True)]:
+                config.FIGURE_SLIM = enabled
+                cache.clear()
+                body = json.dumps(build(), cls=PlotlyJSONEncoder).encode('utf-8')
+                sizes = {'raw_bytes': len(body)}
+                for encoding in encodings:
+                    sizes[f'{encoding}_bytes'] = len(compression.compress(body, encoding))
+                results[name][label] = sizes
+    finally:
+        config.FIGURE_SLIM = slim
+        cache.clear()
+    return results
+
+
+# First visit to each page: the layout built with empty caches, when the default figure
+# has to be built versus read from the files written by `python prerender.py`
+def bench_first_paint(repeat=5):
+    import config
+    import pages
+    import prerender
+    from figure_cache import cache
+
+    def cold():
+        cache.clear()
+        prerender._figures.clear()
+
+    prerender_dir = config.PRERENDER_DIR
+    paths = ['/', '/salary-map', '/mpi-map', '/income-map', '/gdp-map']
+    results = {}
+    try:
+        for label in ('built', 'prerendered'):
+            config.PRERENDER_DIR = tempfile.mkdtemp(prefix='fyp-prerender-')
+            if label == 'prerendered':
+                prerender.build()
+            results[label] = {path: timeit(lambda: pages.layout(path), repeat, setup=cold) for path in paths}
+    finally:
+        config.PRERENDER_DIR = prerender_dir
+        cold()
+    return results
+
+
+# Import of app.py in a fresh interpreter: wall time and peak memory of the import
+def bench_startup(repeat=3):
+    code = (
+        "import json, sys, time, tracemalloc\n"
+        "trace = sys.argv[1] == 'trace'\n"
+        "if trace: tracemalloc.start()\n"
+        "start = time.perf_counter()\n"
+        "import app\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        "peak = tracemalloc.get_traced_memory()[1] if trace else None\n"
+        "print(json.dumps({'import_ms': elapsed, 'peak_bytes': peak}))\n"
+    )
+
+    def run(mode):
+        out = subprocess.run([sys.executable, '-c', code, mode], cwd=DEMO_DIR, env=os.environ,
+                             capture_output=True, text=True, check=True)
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    times = [run('time')['import_ms'] for _ in range(repeat)]
+    return {
+        'median_ms': statistics.median(times),
+        'best_ms': min(times),
+        'peak_bytes': run('trace')['peak_bytes'],
+    }
+
+
+# Arguments every server callback is timed with, by the id of its first output.
+# Background callbacks get a no-op set_progress in front.
+CALLBACK_CASES = {
+    'page-content': {'home': ('/',), 'gdp-map': ('/gdp-map',), 'mpi-map': ('/mpi-map',)},
+    'bar-plot': {'poverty-index': ('Poverty Index',), 'gdp': ('Normalized GDP per capita',)},
+    'gdp-map': {'all': (None, 'natural earth'), 'country': ('Albania', 'orthographic')},
+    'income-map': {'all': (None, 'natural earth'), 'country': ('Angola', 'natural earth')},
+    'salary-map': {'all': (None, 'natural earth'), 'country': ('Albania', 'natural earth')},
+    'mpi-intensity-map': {'all': (None, None, 'urban', 'natural earth'),
+                          'country': ('Afghanistan', None, 'rural', 'orthographic')},
+    'inc-forecast-map': {'last-year': (2031,)},
+    'forecast-output': {'country': (1, 'Albania')},
+    'inc-forecast-output': {'country': (1, 'Angola')},
+}
+
+
+# Every callback registered by app.py, called directly. For each case: the first call
+# (which may fit a forecast or fill caches), warm calls, cold calls with the figure cache
+# cleared, the serialized size of the result and the peak memory of a cold call.
+# Clientside callbacks run in the browser and are only listed.
+def bench_callbacks(repeat=5):
+    import app
+    from figure_cache import cache
+
+    results = {}
+    clientside = []
+    for key, spec in app.app.callback_map.items():
+        output = key.lstrip('.').split('.')[0]
+        if 'callback' not in spec:
+            inputs = ', '.join(f"{i['id']}.{i['property']}" for i in spec['inputs'])
+            clientside.append(f"{key.split('@')[0].strip('.').replace('...', ', ')} <- {inputs}")
+            continue
+        fn = spec['callback'].__wrapped__
+        name = f"{fn.__name__}[{output}]"
+        cases = CALLBACK_CASES.get(output)
+        if cases is None:
+            results[name] = 'no benchmark case'
+            continue
+        for case, args in cases.items():
+            if spec['long']:
+                args = (lambda *_: None,) + args
+
+            def call():
+                return fn(*args)
+
+            start = time.perf_counter()
+            result = call()
+            first_ms = (time.perf_counter() - start) * 1000
+            warm = timeit(call, repeat)
+            cold = timeit(call, repeat, setup=cache.clear)
+            cache.clear()
+            results[f"{name}:{case}"] = {
+                'first_call_ms': first_ms,
+                'warm': warm,
+                'cold': cold,
+                'payload_bytes': payload_bytes(result),
+                'peak_bytes': peak_memory(call),
+            }
+    results['clientside'] = sorted(clientside)
+    return results
+
+
+# The JSON endpoints the pages fetch from the browser, and the data API
+def bench_routes(repeat=20):
+    import app
+
+    client = app.app.server.test_client()
+    routes = {
+        'gdp-frames': '/gdp-map/frames?start=1950&end=1959',
+        'mpi-regions': '/mpi-map/regions.json',
+        'api-gdp-country': '/api/gdp?country=France&start=2000',
+        'api-gdp-all': '/api/gdp',
+        'api-gdp-arrow': '/api/gdp?format=arrow',
+    }
+    results = {}
+    for name, url in routes.items():
+        response = client.get(url)
+        result = timeit(lambda: client.get(url).get_data(), repeat)
+        result['status'] = response.status_code
+        result['payload_bytes'] = len(response.data)
+        results[name] = result
+    return results
+
+
+# GDP forecast model selection on a sample of countries: the exhaustive ARIMA grid versus
+# the baselines and stepwise search of model_select. Per search: the wall time of a cold
+# fit of each country, the number of models fitted, and the accuracy of forecasts of the
+# last HOLDOUT years from the years before (`python backtest.py` scores more cutoffs).
+MODEL_SELECT_COUNTRIES = ['Brazil', 'Chile', 'China', 'Egypt', 'Germany', 'India', 'Japan', 'Kenya',
+                          'Mexico', 'Nigeria', 'Norway', 'Peru']
+
+
+def bench_model_select(repeat=1, holdout=5):
+    import data
+    from forecast_store import fit_forecast, prepare_series
+
+    gdp = data.get('gdp')
+    series = {country: prepare_series(gdp, country) for country in MODEL_SELECT_COUNTRIES}
+    # Imports and pool start-up are not part of a fit
+    for search in ('grid', 'stepwise'):
+        fit_forecast(series['Chile'], search=search)
+
+    results = {'countries': len(series)}
+    for search in ('grid', 'stepwise'):
+        times, fits, errors = [], 0, []
+        for country, rows in series.items():
+            times.append(timeit(lambda: fit_forecast(rows, search=search), repeat)['median_ms'])
+            entry = fit_forecast(rows.iloc[:-holdout], steps=holdout, search=search)
+            if search == 'grid':
+                # Every order of the grid, then the chosen one again to forecast
+                fits += len(entry['aic_table']) + len(entry['failed_orders']) + 1
+            else:
+                fits += len(entry['ic_table']) + len(entry['failed_models'])
+            actual = rows['GDP per capita'].to_numpy(dtype=np.float64)[-holdout:]
+            errors.append(np.abs(np.asarray(entry['forecast']) - actual) / actual * 100)
+        results[search] = {
+            'median_ms': statistics.median(times),
+            'total_ms': sum(times),
+            'fits_per_country': fits / len(series),
+            'holdout_mape': float(np.mean(errors)),
+        }
+    results['speedup'] = results['grid']['total_ms'] / results['stepwise']['total_ms']
+    return results
+
+
+BENCHMARKS = {
+    'batch-forecast': bench_batch_forecast,
+    'callbacks': bench_callbacks,
+    'data-load': bench_data_load,
+    'first-paint': bench_first_paint,
+    'forecast-render': bench_forecast_render,
+    'gdp-stream': bench_gdp_stream,
+    'model-select': bench_model_select,
+    'payloads': bench_payloads,
+    'routes': bench_routes,
+    'startup': bench_startup,
+}
+
+
+# Copies of the bundled datasets with every country repeated `scale` times under a new
+# name and its values jittered, to see how the hot paths grow with the data
+def make_synthetic_data(directory, scale, seed=0):
+    import data
+
+    rng = np.random.default_rng(seed)
+    for name, spec in data.DATASETS.items():
+        frame = pd.read_csv(data.path(name))
+        copies = [frame]
+        for i in range(1, scale):
+            copy = frame.copy()
+            copy['Country'] = copy['Country'] + f' ({i})'
+            for column in copy.select_dtypes('float').columns:
+                if column not in ('Latitude', 'Longitude'):
+                    copy[column] = copy[column] * rng.uniform(0.9, 1.1, len(copy))
+            copies.append(copy)
+        pd.concat(copies, ignore_index=True).to_csv(os.path.join(directory, spec['file']), index=False)
+
+
+# Timings and sizes, where a higher value is worse: (path, value) for every leaf
+def metrics(results, path=''):
+    if isinstance(results, dict):
+        for key, value in results.items():
+            yield from metrics(value, f"{path}.{key}" if path else key)
+    elif isinstance(results, (int, float)) and (path.endswith('median_ms') or path.endswith('bytes')):
+        yield path, results
+
+
+# Metrics more than `tolerance` (a fraction) worse than the baseline. Differences under
+# `min_ms` milliseconds are ignored as noise.
+def compare(results, baseline, tolerance=0.2, min_ms=1.0):
+    current = dict(metrics(results))
+    regressions = []
+    for path, before in metrics(baseline):
+        after = current.get(path)
+        if after is None or before <= 0:
+            continue
+        if path.endswith('_ms') and after - before < min_ms:
+            continue
+        if after > before * (1 + tolerance):
+            regressions.append((path, before, after))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Performance benchmarks for the demo app')
+    parser.add_argument('benchmarks', nargs='*', help=f"benchmarks to run, any of {', '.join(sorted(BENCHMARKS))} (default: all)")
+    parser.add_argument('--output', help='write the results to this JSON file (e.g. to save a baseline)')
+    parser.add_argument('--baseline', help='compare against the results saved in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown or growth against the baseline (default: 0.2)')
+    parser.add_argument('--synthetic', type=int, metavar='SCALE', help='run on the bundled data with every country repeated SCALE times')
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Keep the forecast store and job queue of the benchmark runs out of the project
+    scratch = tempfile.mkdtemp(prefix='fyp-bench-')
+    os.environ.setdefault('FYP_FORECAST_STORE', os.path.join(scratch, 'gdp_forecasts.json'))
+    os.environ.setdefault('FYP_JOBS_DIR', os.path.join(scratch, 'jobs'))
+    dataset = 'bundled'
+    if args.synthetic:
+        make_synthetic_data(scratch, args.synthetic)
+        import config
+        # For this process (config is already imported) and for the startup subprocess
+        config.DATA_ROOT = os.environ['FYP_DATA_ROOT'] = scratch
+        dataset = f'synthetic x{args.synthetic}'
+    if DEMO_DIR not in sys.path:
+        sys.path.insert(0, DEMO_DIR)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'data': dataset,
+        },
+        'results': {},
+    }
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        print(f"== {name}")
+        report['results'][name] = BENCHMARKS[name]()
+        print(json.dumps(report['results'][name], indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        names = set(report['results'])
+        regressions = compare(report['results'], {k: v for k, v in baseline['results'].items() if k in names},
+                              args.tolerance)
+        print(f"== compared with {args.baseline} ({baseline['meta']['timestamp']}, {baseline['meta']['data']})")
+        for path, before, after in regressions:
+            print(f"REGRESSION {path}: {before:,.1f} -> {after:,.1f} ({after / before - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print('no regressions')
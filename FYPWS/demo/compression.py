@@ -0,0 +1,74 @@
+import gzip
+
+from flask import request
+
+import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# gzip or brotli compression of the Flask server's responses (callback JSON, figures,
+# data chunks, the Dash JS bundles), negotiated with the Accept-Encoding header.
+# brotli is used when the `brotli` package is installed and the client accepts it.
+
+COMPRESSIBLE = ('application/json', 'application/javascript', 'text/')
+
+
+# Quality of every coding listed in an Accept-Encoding header, e.g. 'gzip;q=0.5, br'
+def parse_accept_encoding(accept_encoding):
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.lower()] = q
+    return qualities
+
+
+# Encoding to use: the accepted one with the highest quality, brotli on a tie.
+# q=0 refuses an encoding; '*' stands for the codings not listed.
+def accepted_encoding(accept_encoding):
+    qualities = parse_accept_encoding(accept_encoding)
+    wildcard = qualities.get('*', 0.0)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = qualities.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE)):
+        return response
+    encoding = accepted_encoding(request.headers.get('Accept-Encoding', ''))
+    body = response.get_data()
+    if encoding is None or len(body) < config.COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def register(server):
+    server.after_request(compress_response)
@@ -0,0 +1,88 @@
+import json
+import os
+
+# Settings for the demo app. Every value can be overridden with an environment variable.
+DEMO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Directory holding the demo datasets (GDPmap.csv, incomeMap.csv, ...)
+DATA_ROOT = os.environ.get("FYP_DATA_ROOT", DEMO_DIR)
+
+# Precomputed GDP forecasts
+FORECAST_STORE = os.environ.get("FYP_FORECAST_STORE", os.path.join(DEMO_DIR, "forecast_store", "gdp_forecasts.json"))
+
+# Process pool used by the ARIMA order search
+SEARCH_WORKERS = int(os.environ.get("FYP_SEARCH_WORKERS", os.cpu_count() or 1))
+
+# ARIMA order search limits: seconds a single fit may run before it counts as failed (its
+# worker is then terminated), and finished fits in a row without a better AIC before the
+# search stops early. 0 turns either limit off.
+SEARCH_FIT_TIMEOUT = float(os.environ.get("FYP_SEARCH_FIT_TIMEOUT", 30))
+SEARCH_PATIENCE = int(os.environ.get("FYP_SEARCH_PATIENCE", 0))
+
+# Background job queue for the forecast pages
+JOBS_DIR = os.environ.get("FYP_JOBS_DIR", os.path.join(DEMO_DIR, "jobs_cache"))
+JOB_TTL = int(os.environ.get("FYP_JOB_TTL", 600))
+
+# Server-side cache of map figures. Set FYP_FIGURE_CACHE_DIR to also keep them on disk,
+# shared by every worker process.
+FIGURE_CACHE_ENTRIES = int(os.environ.get("FYP_FIGURE_CACHE_ENTRIES", 128))
+FIGURE_CACHE_BYTES = int(os.environ.get("FYP_FIGURE_CACHE_BYTES", 256 * 1024 * 1024))
+FIGURE_CACHE_DIR = os.environ.get("FYP_FIGURE_CACHE_DIR") or None
+
+# Number of countries shown in the home page rankings
+RANKING_N = int(os.environ.get("FYP_RANKING_N", 10))
+
+# Raw source CSVs the ETL pipeline (etl.py) builds the demo datasets from
+RAW_ROOT = os.environ.get("FYP_RAW_ROOT", os.path.dirname(DEMO_DIR))
+
+# Geocoding for the ETL pipeline: persistent lookup table, and whether regions missing
+# from the bundled tables may be looked up online (needs geopy)
+GEOCODE_CACHE = os.environ.get("FYP_GEOCODE_CACHE", os.path.join(RAW_ROOT, "geocode_cache.csv"))
+GEOCODE_NETWORK = os.environ.get("FYP_GEOCODE_NETWORK", "0") == "1"
+
+# Weights of the Poverty Index indicators as JSON, e.g. '{"GDP per capita": 2}'. Unlisted indicators weigh 1.
+POVERTY_WEIGHTS = json.loads(os.environ.get("FYP_POVERTY_WEIGHTS", "{}"))
+
+# GDP world map: load one year and stream the other years in chunks of this many years
+# from /gdp-map/frames, instead of sending every animation frame up front
+GDP_MAP_STREAMING = os.environ.get("FYP_GDP_MAP_STREAMING", "1") == "1"
+GDP_MAP_CHUNK_YEARS = int(os.environ.get("FYP_GDP_MAP_CHUNK_YEARS", 10))
+
+# Callback metrics on /metrics (Prometheus text format), and the duration in ms above which
+# a callback is logged with its inputs (0 turns the slow callback log off)
+METRICS = os.environ.get("FYP_METRICS", "1") == "1"
+SLOW_CALLBACK_MS = float(os.environ.get("FYP_SLOW_CALLBACK_MS", 0))
+
+# Pages whose datasets and figures are loaded at startup instead of on their first request,
+# as a comma-separated list of paths (e.g. "/,/gdp-map"), or "all"
+PRELOAD_PAGES = [page for page in os.environ.get("FYP_PRELOAD_PAGES", "").split(",") if page]
+
+# Production server (gunicorn -c gunicorn.conf.py): listen address and number of worker processes
+BIND = os.environ.get("FYP_BIND", "0.0.0.0:8050")
+WORKERS = int(os.environ.get("FYP_WORKERS", 2 * (os.cpu_count() or 1) + 1))
+
+# gzip (or brotli, when installed) for responses of at least COMPRESS_MIN_BYTES
+COMPRESS = os.environ.get("FYP_COMPRESS", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("FYP_COMPRESS_MIN_BYTES", 1024))
+
+# Map figure payloads: drop data repeated in every animation frame, round numeric arrays to
+# FIGURE_PRECISION significant digits and send them as base64 typed arrays. Compressed,
+# the rounded decimal text is as small or smaller than the typed arrays, so these are
+# only on by default when responses are not compressed.
+FIGURE_SLIM = os.environ.get("FYP_FIGURE_SLIM", "1") == "1"
+FIGURE_PRECISION = int(os.environ.get("FYP_FIGURE_PRECISION", 5))
+FIGURE_TYPED_ARRAYS = os.environ.get("FYP_FIGURE_TYPED_ARRAYS", "0" if COMPRESS else "1") == "1"
+
+# Default figure of each page, serialized by `python prerender.py` and shipped in the page layouts
+PRERENDER_DIR = os.environ.get("FYP_PRERENDER_DIR", os.path.join(DEMO_DIR, "prerendered"))
+
+# Model selection for the GDP forecasts: "stepwise" (model_select.py: exponential smoothing and drift
+# baselines, then a stepwise ARIMA search) or "grid" (every ARIMA order of arima_search.py). A baseline
+# is kept unless an ARIMA model beats its AICc by more than BASELINE_MARGIN.
+FORECAST_SEARCH = os.environ.get("FYP_FORECAST_SEARCH", "stepwise")
+BASELINE_MARGIN = float(os.environ.get("FYP_BASELINE_MARGIN", 2))
+
+# Rolling-origin backtests of the forecast models (python backtest.py): where the error tables
+# are written, and the cache of fitted models reused by later runs
+BACKTEST_DIR = os.environ.get("FYP_BACKTEST_DIR", os.path.join(DEMO_DIR, "backtest_results"))
+BACKTEST_CACHE = os.environ.get("FYP_BACKTEST_CACHE", os.path.join(DEMO_DIR, "backtest_cache"))
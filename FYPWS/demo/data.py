@@ -0,0 +1,176 @@
+import functools
+import os
+import sys
+import threading
+
+import pandas as pd
+
+import config
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Derived frames never write through to the shared ones
+try:
+    pd.set_option('mode.copy_on_write', True)
+except (KeyError, ValueError):
+    pass
+
+# Every dataset used by the pages, with the dtypes it is loaded with.
+# Columns not listed keep the type pandas infers.
+DATASETS = {
+    'gdp': {
+        'file': 'GDPmap.csv',
+        'dtypes': {
+            'Country': 'category', 'Code': 'category', 'Year': 'int16',
+            'GDP per capita': 'float32', 'Latitude': 'float32', 'Longitude': 'float32',
+        },
+    },
+    'income': {
+        'file': 'incomeMap.csv',
+        'dtypes': {
+            'Country': 'category', 'Code': 'category', 'Continent': 'category', 'Hemisphere': 'category',
+            'Human Development Groups': 'category', 'UNDP Developing Regions': 'category',
+            'HDI Rank (2021)': 'float32', 'Year': 'int16', 'Value': 'float32',
+        },
+    },
+    'mpi': {
+        'file': 'MPImap.csv',
+        'dtypes': {
+            'Code': 'category', 'Country': 'category', 'Sub-national region': 'category', 'World region': 'category',
+            'MPI Urban': 'float32', 'Headcount Ratio Urban': 'float32', 'Intensity of Deprivation Urban': 'float32',
+            'MPI Rural': 'float32', 'Headcount Ratio Rural': 'float32', 'Intensity of Deprivation Rural': 'float32',
+            'MPI National': 'float32', 'MPI Regional': 'float32', 'Headcount Ratio Regional': 'float32',
+            'Intensity of deprivation Regional': 'float32', 'Latitude': 'float32', 'Longitude': 'float32',
+        },
+    },
+    'salary': {
+        'file': 'salaryMap.csv',
+        'dtypes': {
+            'Country': 'category', 'Continent': 'category', 'Wage Span': 'category',
+            'Median Salary': 'float32', 'Average Salary': 'float32', 'Lowest Salary': 'float32',
+            'Highest Salary': 'float32', 'Latitude': 'float32', 'Longitude': 'float32',
+        },
+    },
+    'complete': {
+        'file': 'complete_data.csv',
+        'dtypes': {
+            'Country': 'category', 'Median Salary': 'float32', 'Inequality in Income': 'float32',
+            'GDP per capita': 'float32', 'Intensity of Deprivation Urban': 'float32',
+            'Intensity of Deprivation Rural': 'float32', 'Normalized Median Salary': 'float32',
+            'Normalized Inequality in Income': 'float32', 'Normalized GDP per capita': 'float32',
+            'Normalized Intensity of Deprivation Urban': 'float32',
+            'Normalized Intensity of Deprivation Rural': 'float32', 'Poverty Index': 'float32',
+        },
+    },
+}
+
+_frames = {}
+_versions = {}
+_modified = {}
+_lock = threading.Lock()
+
+
+def path(name):
+    return os.path.join(config.DATA_ROOT, DATASETS[name]['file'])
+
+
+# Typed binary copy written next to the CSV by `python data.py convert`
+def cache_path(name):
+    return os.path.splitext(path(name))[0] + '.feather'
+
+
+def read_csv(name):
+    return pd.read_csv(path(name), dtype=DATASETS[name]['dtypes'])
+
+
+# The Feather copy is only used when it is at least as new as the CSV
+def cache_is_fresh(name):
+    if feather is None or not os.path.exists(cache_path(name)):
+        return False
+    return os.path.getmtime(cache_path(name)) >= os.path.getmtime(path(name))
+
+
+def load(name):
+    if cache_is_fresh(name):
+        table = feather.read_table(cache_path(name), memory_map=True)
+        return table.to_pandas()
+    return read_csv(name)
+
+
+# Write uncompressed Feather copies (memory-mappable) of the given datasets
+def convert(names=None):
+    if feather is None:
+        raise RuntimeError("pyarrow is required to write the Feather cache")
+    for name in names or DATASETS:
+        feather.write_feather(read_csv(name), cache_path(name), compression='uncompressed')
+
+
+# Shared frame for a dataset, loaded once per process. Treat it as read-only:
+# filter or copy it instead of modifying it in place.
+def get(name):
+    frame = _frames.get(name)
+    if frame is None:
+        with _lock:
+            frame = _frames.get(name)
+            if frame is None:
+                stat = os.stat(path(name))
+                frame = _frames[name] = load(name)
+                _versions[name] = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+                _modified[name] = stat.st_mtime
+    return frame
+
+
+# Version of the loaded frame, taken from the size and mtime of its CSV.
+# Caches of anything derived from a dataset include it in their keys.
+def version(name):
+    get(name)
+    return _versions[name]
+
+
+# Decorator for a table or index derived from a dataset: `fn(frame)` runs on the first
+# call and again only after the dataset's version changes. Lets page modules define
+# their data at import without loading anything.
+def derived(name):
+    def decorator(fn):
+        cached = {}
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper():
+            current = version(name)
+            with lock:
+                if cached.get('version') != current:
+                    cached['value'] = fn(get(name))
+                    cached['version'] = current
+                return cached['value']
+        return wrapper
+    return decorator
+
+
+# Modification time of the CSV the loaded frame was read from, as a Unix timestamp
+def modified(name):
+    get(name)
+    return _modified[name]
+
+
+# Names of the datasets loaded so far in this process
+def loaded():
+    return sorted(_frames)
+
+
+def preload(names=None):
+    for name in names or DATASETS:
+        get(name)
+
+
+# Conversion step: python data.py convert [dataset ...]
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'convert':
+        sys.exit("usage: python data.py convert [dataset ...]")
+    names = sys.argv[2:] or list(DATASETS)
+    convert(names)
+    for name in names:
+        print(f"{name}: wrote {cache_path(name)}")
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import json
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from flask import Response, abort, jsonify, request
+
+import data
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Read-only HTTP API over the datasets behind the pages, served from the in-memory frames:
+#
+#   GET /api/datasets            names, versions, rows and columns of every dataset
+#   GET /api/<dataset>           rows of a dataset, optionally filtered with
+#       ?country=<name>          (repeatable) rows of these countries
+#       ?start=<year>&end=<year> rows of these years, for the datasets with a Year column
+#       ?indicator=<column>      (repeatable) only these value columns besides the keys
+#       ?format=json|arrow       a JSON array of records (default) or an Arrow IPC stream
+#
+# Responses carry an ETag made from the dataset version and the query, and the dataset's
+# Last-Modified, so clients and proxies can revalidate them. Rows are sent in chunks of
+# CHUNK_ROWS as they are serialized.
+
+KEY_COLUMNS = ['Country', 'Code', 'Sub-national region', 'Year']
+CHUNK_ROWS = 5000
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def bad_request(message):
+    abort(Response(json.dumps({'error': message}), status=400, mimetype='application/json'))
+
+
+# Integer query argument, None when absent. A malformed value is refused rather than
+# dropped, which would answer with the unfiltered dataset.
+def int_arg(key):
+    value = request.args.get(key)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        bad_request(f"{key} must be an integer year")
+
+
+# Row positions of every country of a dataset, built once per dataset version
+def country_index(name):
+    key = (name, data.version(name))
+    index = _indexes.get(key)
+    if index is None:
+        with _lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = _indexes[key] = data.get(name).groupby('Country', observed=True, sort=False).indices
+    return index
+
+
+# Rows and columns of a dataset matching the query arguments
+def select(name, countries=(), start=None, end=None, indicators=()):
+    frame = data.get(name)
+    unknown = [column for column in indicators if column not in frame.columns or column in KEY_COLUMNS]
+    if unknown:
+        bad_request(f"Unknown indicators for {name}: {', '.join(unknown)}")
+    columns = [column for column in frame.columns if column in KEY_COLUMNS or not indicators or column in indicators]
+
+    if countries:
+        index = country_index(name)
+        positions = np.sort(np.concatenate([index.get(country, np.empty(0, dtype=np.intp)) for country in countries]))
+        rows = frame.iloc[positions]
+    else:
+        rows = frame
+    if start is not None or end is not None:
+        if 'Year' not in frame.columns:
+            bad_request(f"{name} has no Year column")
+        years = rows['Year'].to_numpy()
+        mask = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            mask &= years >= start
+        if end is not None:
+            mask &= years <= end
+        rows = rows[mask]
+    return rows[columns]
+
+
+# float32 columns go out with their shortest decimal form (33409.68, not 33409.6796875)
+def _shortest_floats(chunk):
+    columns = {column: chunk[column].to_numpy().astype(str).astype(np.float64)
+               for column in chunk.columns if chunk[column].dtype == np.float32}
+    return chunk.assign(**columns) if columns else chunk
+
+
+def json_chunks(rows):
+    yield '['
+    for offset in range(0, len(rows), CHUNK_ROWS):
+        records = _shortest_floats(rows.iloc[offset:offset + CHUNK_ROWS]).to_json(orient='records')
+        yield (',' if offset else '') + records[1:-1]
+    yield ']'
+
+
+def arrow_chunks(rows):
+    sink = io.BytesIO()
+    schema = pa.Schema.from_pandas(rows, preserve_index=False)
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for offset in range(0, len(rows), CHUNK_ROWS):
+            writer.write_batch(pa.RecordBatch.from_pandas(rows.iloc[offset:offset + CHUNK_ROWS], schema=schema,
+                                                          preserve_index=False))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    # End-of-stream marker
+    yield sink.getvalue()
+
+
+def etag(name, arguments):
+    query = json.dumps(sorted((key, sorted(values)) for key, values in arguments.lists()))
+    digest = hashlib.sha1(f"{data.version(name)}|{query}".encode('utf-8')).hexdigest()[:16]
+    return f"{name}-{digest}"
+
+
+def dataset_response(name):
+    if name not in data.DATASETS:
+        abort(404)
+    output = request.args.get('format', 'json')
+    if output not in ('json', 'arrow'):
+        bad_request("format must be json or arrow")
+    if output == 'arrow' and pa is None:
+        abort(Response(json.dumps({'error': 'pyarrow is not installed'}), status=501, mimetype='application/json'))
+    start, end = int_arg('start'), int_arg('end')
+
+    tag = etag(name, request.args)
+    modified = datetime.fromtimestamp(data.modified(name), tz=timezone.utc).replace(microsecond=0)
+    # Answered before any row is read
+    if request.if_none_match.contains(tag) or (
+            not request.if_none_match and request.if_modified_since and request.if_modified_since >= modified):
+        response = Response(status=304)
+    else:
+        rows = select(
+            name,
+            countries=request.args.getlist('country'),
+            start=start,
+            end=end,
+            indicators=request.args.getlist('indicator'),
+        )
+        if output == 'arrow':
+            response = Response(arrow_chunks(rows), mimetype=ARROW_MIMETYPE)
+        else:
+            response = Response(json_chunks(rows), mimetype='application/json')
+        response.headers['X-Row-Count'] = str(len(rows))
+    response.set_etag(tag)
+    response.last_modified = modified
+    response.headers['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
+
+
+def datasets_response():
+    return jsonify({
+        name: {
+            'version': data.version(name),
+            'last_modified': datetime.fromtimestamp(data.modified(name), tz=timezone.utc).isoformat(),
+            'rows': len(data.get(name)),
+            'columns': list(data.get(name).columns),
+        }
+        for name in data.DATASETS
+    })
+
+
+def register(server):
+    server.add_url_rule('/api/datasets', 'data_api_datasets', datasets_response)
+    server.add_url_rule('/api/<name>', 'data_api_dataset', dataset_response)
@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import config
+from geocode import Geocoder
+from poverty_index import PovertyIndex
+
+# Builds the demo datasets from the raw CSVs in FYPWS/, replacing the preprocessing
+# cells of fyp.ipynb. Every stage lists the files it reads and writes; a stage is
+# skipped when its code and the hashes of its inputs and outputs match the previous run.
+#
+#   python etl.py                 run every stage that is out of date
+#   python etl.py mpi complete    run the given stages (and skip them if up to date)
+#   python etl.py --force         rebuild everything
+
+STATE_FILE = os.path.join(config.DATA_ROOT, '.etl_state.json')
+
+
+def raw(name):
+    return os.path.join(config.RAW_ROOT, name)
+
+
+def out(name):
+    return os.path.join(config.DATA_ROOT, name)
+
+
+# The datasets are kept with CRLF line endings like the rest of the tree, so a rebuild
+# only shows the rows that changed
+def write(frame, name):
+    frame.to_csv(out(name), index=False, lineterminator='\r\n')
+
+
+# Shared by the stages of one run so the lookup tables are read once
+_geocoder = None
+
+
+def geocoder():
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = Geocoder()
+    return _geocoder
+
+
+def stage_salary():
+    salary = pd.read_csv(raw('salary_data.csv'))
+    salary = salary.rename(columns={
+        'country_name': 'Country',
+        'continent_name': 'Continent',
+        'wage_span': 'Wage Span',
+        'median_salary': 'Median Salary',
+        'average_salary': 'Average Salary',
+        'lowest_salary': 'Lowest Salary',
+        'highest_salary': 'Highest Salary',
+    })
+    coords = geocoder().resolve(salary['Country'])
+    salary['Latitude'] = coords['Latitude'].to_numpy()
+    salary['Longitude'] = coords['Longitude'].to_numpy()
+    write(salary, 'salaryMap.csv')
+
+
+def stage_gdp():
+    gdp = pd.read_csv(raw('gdp-per-capita.csv'))
+    gdp = gdp.rename(columns={'Entity': 'Country'}).drop(columns='145446-annotations')
+    coords = pd.read_csv(out('salaryMap.csv'), usecols=['Country', 'Latitude', 'Longitude'])
+    # Inner join: countries without coordinates (and aggregates without a code) are dropped
+    gdp = gdp.merge(coords, on='Country', how='inner').dropna()
+    write(gdp, 'GDPmap.csv')
+
+
+def stage_income():
+    income = pd.read_csv(raw('Inequality in Income.csv'))
+    income = income.rename(columns={'ISO3': 'Code'})
+    income = income.rename(columns=lambda c: c[len('Inequality in income ('):-1] if c.startswith('Inequality in income (') else c)
+    income = pd.melt(
+        income,
+        id_vars=['Country', 'Code', 'Continent', 'Hemisphere', 'Human Development Groups',
+                 'UNDP Developing Regions', 'HDI Rank (2021)'],
+        var_name='Year',
+        value_name='Value'
+    )
+    income['Year'] = income['Year'].astype(int)
+    income = income.fillna(0)
+    write(income, 'incomeMap.csv')
+
+
+def stage_mpi():
+    national = pd.read_csv(raw('MPI_national.csv')).rename(columns={'ISO': 'Code'})
+    subnational = pd.read_csv(raw('MPI_subnational.csv')).rename(columns={'ISO country code': 'Code'})
+    mpi = national.merge(subnational, how='left')
+
+    text_columns = ['Sub-national region', 'World region']
+    mpi[text_columns] = mpi[text_columns].fillna('Unknown')
+    mpi = mpi.fillna(0)
+
+    # Regions that cannot be located are placed at their country's centroid;
+    # rows whose country is unknown are dropped
+    regions = mpi['Sub-national region'].where(mpi['Sub-national region'] != 'Unknown', '')
+    coords = geocoder().resolve(mpi['Country'], regions, mpi['Code'])
+    mpi['Latitude'] = coords['Latitude'].to_numpy()
+    mpi['Longitude'] = coords['Longitude'].to_numpy()
+    mpi = mpi.dropna(subset=['Latitude', 'Longitude'])
+
+    region = mpi['Sub-national region']
+    mpi['Hover Name'] = np.where(region != 'Unknown', region + ', ' + mpi['Country'], mpi['Country'])
+    write(mpi, 'MPImap.csv')
+
+
+def stage_complete():
+    income = pd.read_csv(out('incomeMap.csv'), usecols=['Country', 'Year', 'Value'])
+    income = income[income['Year'] == 2021].drop(columns='Year')
+
+    mpi = pd.read_csv(out('MPImap.csv'), usecols=['Country', 'Intensity of Deprivation Urban', 'Intensity of Deprivation Rural'])
+    mpi = mpi.groupby('Country', as_index=False).mean()
+
+    salary = pd.read_csv(out('salaryMap.csv'), usecols=['Country', 'Median Salary'])
+
+    gdp = pd.read_csv(out('GDPmap.csv'), usecols=['Country', 'Year', 'GDP per capita'])
+    gdp = gdp[gdp['Year'] == 2018].drop(columns='Year')
+
+    combined = salary.merge(income, on='Country', how='outer') \
+                     .merge(gdp, on='Country', how='outer') \
+                     .merge(mpi, on='Country', how='outer')
+    combined = combined.fillna(0).rename(columns={'Value': 'Inequality in Income'})
+
+    # Normalized columns and Poverty Index with the default weights and inversion rules
+    write(PovertyIndex(combined).frame(), 'complete_data.csv')
+
+
+# Lookup tables read by the geocoder; the network cache may not exist yet
+GEOCODE_INPUTS = [raw('country_centroids.csv'), raw('region_coordinates.csv'), config.GEOCODE_CACHE]
+
+# name -> (function, inputs, outputs), in dependency order
+STAGES = {
+    'salary': (stage_salary, [raw('salary_data.csv')] + GEOCODE_INPUTS, [out('salaryMap.csv')]),
+    'gdp': (stage_gdp, [raw('gdp-per-capita.csv'), out('salaryMap.csv')], [out('GDPmap.csv')]),
+    'income': (stage_income, [raw('Inequality in Income.csv')], [out('incomeMap.csv')]),
+    'mpi': (stage_mpi, [raw('MPI_national.csv'), raw('MPI_subnational.csv')] + GEOCODE_INPUTS, [out('MPImap.csv')]),
+    'complete': (stage_complete, [out('incomeMap.csv'), out('MPImap.csv'), out('salaryMap.csv'), out('GDPmap.csv')],
+                 [out('complete_data.csv')]),
+}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+
+
+def optional_hash(path):
+    return file_hash(path) if os.path.exists(path) else None
+
+
+# Fingerprint of a stage: its code, its inputs, and its outputs so a hand-edited output is rebuilt
+def fingerprint(fn, inputs, outputs):
+    return {
+        'code': hashlib.sha256(inspect.getsource(fn).encode('utf-8')).hexdigest(),
+        'inputs': {os.path.basename(p): optional_hash(p) for p in inputs},
+        'outputs': {os.path.basename(p): optional_hash(p) for p in outputs},
+    }
+
+
+# Run the selected stages in dependency order and return [(stage, status, seconds)]
+def run(stages=None, force=False):
+    state = load_state()
+    report = []
+    for name, (fn, inputs, outputs) in STAGES.items():
+        if stages and name not in stages:
+            continue
+        start = time.perf_counter()
+        if not force and state.get(name) == fingerprint(fn, inputs, outputs):
+            report.append((name, 'skipped', time.perf_counter() - start))
+            continue
+        fn()
+        state[name] = fingerprint(fn, inputs, outputs)
+        save_state(state)
+        report.append((name, 'built', time.perf_counter() - start))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the demo datasets from the raw CSVs')
+    parser.add_argument('stages', nargs='*', help=f"stages to run, any of {', '.join(STAGES)} (default: all)")
+    parser.add_argument('--force', action='store_true', help='rebuild even if the inputs did not change')
+    args = parser.parse_args()
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    total = 0.0
+    for name, status, seconds in run(args.stages, args.force):
+        total += seconds
+        print(f"{name:<10} {status:<8} {seconds * 1000:8.1f} ms")
+    print(f"{'total':<19} {total * 1000:8.1f} ms")
+    if _geocoder is not None:
+        sources = ', '.join(f"{source}: {count}" for source, count in sorted(_geocoder.counts.items()))
+        print(f"geocoded rows by source: {sources} ({_geocoder.rejected} bundled region points rejected)")
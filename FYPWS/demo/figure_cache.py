@@ -0,0 +1,123 @@
+import functools
+import json
+import threading
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+import config
+import data
+
+
+# In-memory LRU of figure dicts, bounded by entry count and by serialized size,
+# optionally backed by a diskcache directory shared between worker processes
+class FigureCache:
+    def __init__(self, max_entries, max_bytes, directory=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (figure, size in bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.disk = None
+        if directory:
+            import diskcache
+            self.disk = diskcache.Cache(directory, size_limit=max_bytes * 4)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        if self.disk is not None:
+            figure = self.disk.get(key)
+            if figure is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, figure)
+                return figure
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, figure):
+        self._remember(key, figure)
+        if self.disk is not None:
+            self.disk.set(key, figure)
+
+    def _remember(self, key, figure):
+        size = len(json.dumps(figure, cls=PlotlyJSONEncoder))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (figure, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
+
+
+cache = FigureCache(config.FIGURE_CACHE_ENTRIES, config.FIGURE_CACHE_BYTES, config.FIGURE_CACHE_DIR)
+
+# Lookups of the current request ('hit' or 'miss'), kept while metrics.py records them
+_recording = threading.local()
+
+
+def start_recording():
+    _recording.lookups = []
+
+
+def stop_recording():
+    lookups = getattr(_recording, 'lookups', None) or []
+    _recording.lookups = None
+    return lookups
+
+
+def _record(status):
+    lookups = getattr(_recording, 'lookups', None)
+    if lookups is not None:
+        lookups.append(status)
+
+
+# Memoize a function that builds a figure dict from a few hashable arguments
+# (dropdown values). The key also holds the versions of the datasets it reads,
+# so a reloaded dataset never serves figures built from the old one.
+def cached_figure(namespace, datasets=()):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = (namespace, tuple(data.version(name) for name in datasets)) + args
+            figure = cache.get(key)
+            if figure is None:
+                _record('miss')
+                figure = fn(*args)
+                cache.put(key, figure)
+            else:
+                _record('hit')
+            return figure
+        return wrapper
+    return decorator
@@ -0,0 +1,110 @@
+import base64
+
+import numpy as np
+from dash import ClientsideFunction
+from dash.dependencies import Input, Output, State
+
+import config
+
+
+# Copy of a cached figure dict with another projection. Only the dicts on the path to
+# layout.geo.projection are copied, the trace and frame data is shared with the cache.
+def with_projection(fig, projection):
+    if not projection:
+        return fig
+    layout = dict(fig['layout'])
+    geo = dict(layout.get('geo', {}))
+    geo['projection'] = dict(geo.get('projection', {}), type=projection)
+    layout['geo'] = geo
+    return dict(fig, layout=layout)
+
+
+# Change the projection of the figure already in the browser (assets/map_toggles.js),
+# without a server round trip. The server callbacks read the dropdown as State.
+def register_projection_toggle(app, graph_id, dropdown_id):
+    app.clientside_callback(
+        ClientsideFunction(namespace='maps', function_name='set_projection'),
+        Output(graph_id, 'figure', allow_duplicate=True),
+        Input(dropdown_id, 'value'),
+        State(graph_id, 'figure'),
+        prevent_initial_call=True
+    )
+
+
+# Smaller payloads for the map figures, applied by their cached builders:
+#   - trace keys with the same value in every frame as in the trace are dropped from the
+#     frames, plotly.js keeps the trace's value when it animates
+#   - numeric arrays are rounded to FIGURE_PRECISION significant digits
+#   - and sent as base64 typed arrays ({'dtype': 'f4', 'bdata': ...}), which plotly.js
+#     (2.28+) decodes
+# FYP_FIGURE_SLIM=0 turns this off.
+
+def round_significant(values, digits):
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.floor(np.log10(np.abs(values), out=np.zeros_like(values), where=values != 0))
+    scale = 10.0 ** (digits - 1 - magnitude)
+    return np.round(values * scale) / scale
+
+
+# Rounded (and typed-array encoded) copy of a 1-d numeric array, other values unchanged
+def encode_array(values, precision=None, typed=None):
+    if not config.FIGURE_SLIM:
+        return values
+    precision = config.FIGURE_PRECISION if precision is None else precision
+    typed = config.FIGURE_TYPED_ARRAYS if typed is None else typed
+    if isinstance(values, (list, tuple)):
+        if not values or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return values
+        values = np.asarray(values)
+    if not isinstance(values, np.ndarray) or values.ndim != 1 or values.dtype.kind not in 'iuf':
+        return values
+    if values.dtype.kind == 'f':
+        if precision:
+            values = round_significant(values, precision)
+        # float32 holds about 7 significant digits
+        dtype = 'f4' if precision and precision <= 7 else 'f8'
+    else:
+        fits = [dtype for dtype in ('i1', 'i2', 'i4')
+                if len(values) == 0 or np.iinfo(dtype).min <= values.min() and values.max() <= np.iinfo(dtype).max]
+        if not fits:
+            return values
+        dtype = fits[0]
+    if not typed:
+        return values
+    data = np.asarray(values, dtype='<' + dtype)
+    return {'dtype': dtype, 'bdata': base64.b64encode(data.tobytes()).decode('ascii')}
+
+
+def _encode_trace(trace):
+    return {key: _encode_trace(value) if isinstance(value, dict) else encode_array(value)
+            for key, value in trace.items()}
+
+
+def _same(a, b):
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.array_equal(np.asarray(a), np.asarray(b))
+    return a == b
+
+
+# Trace keys of the frames holding the same value as the trace in every frame
+def _repeated_keys(trace, frame_traces):
+    return [key for key in trace
+            if all(key in frame_trace and _same(frame_trace[key], trace[key]) for frame_trace in frame_traces)]
+
+
+def slim_figure(fig):
+    if not config.FIGURE_SLIM:
+        return fig
+    data = [_encode_trace(trace) for trace in fig.get('data', [])]
+    frames = fig.get('frames') or []
+    frame_data = [list(frame.get('data', [])) for frame in frames]
+    for i, trace in enumerate(fig.get('data', [])):
+        if frames and all(i < len(traces) for traces in frame_data):
+            repeated = _repeated_keys(trace, [traces[i] for traces in frame_data])
+            for traces in frame_data:
+                traces[i] = {key: value for key, value in traces[i].items() if key not in repeated}
+    slim = dict(fig, data=data)
+    if frames:
+        slim['frames'] = [dict(frame, data=[_encode_trace(trace) for trace in traces])
+                          for frame, traces in zip(frames, frame_data)]
+    return slim
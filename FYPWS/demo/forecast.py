@@ -1,19 +1,19 @@
-from dash import dcc, html
+from dash import dcc, html, no_update
 from dash.dependencies import Input, Output, State
-import pandas as pd
-import statsmodels.api as sm
-import matplotlib.pyplot as plt
-from io import BytesIO
-import base64
-import itertools
+import data
 from sidebar import sidebar
+from forecast_figure import build_forecast_figure, forecast_panel
+import jobs
+from forecast_store import ForecastStore, prepare_series, forecast_frame
 
-# Load the data
-GDPdata = pd.read_csv("C:/Users/William/Documents/FYPWS/demo/GDPmap.csv")
-filtered_data = GDPdata[(GDPdata['Year'] >= 1950) & (GDPdata['Year'] <= 2018)]
+# Precomputed ARIMA forecasts, built with `python forecast_store.py`
+forecast_store = ForecastStore()
 
-# Extract unique country names for the dropdown
-country_options = [{'label': country, 'value': country} for country in filtered_data['Country'].unique()]
+# Unique country names for the dropdown, extracted on first use
+@data.derived('gdp')
+def country_options(GDPdata):
+    filtered_data = GDPdata[(GDPdata['Year'] >= 1950) & (GDPdata['Year'] <= 2018)]
+    return [{'label': country, 'value': country} for country in filtered_data['Country'].unique()]
 
 # Function to create the forecasting layout
 def forecasting_layout():
@@ -25,92 +25,72 @@ def forecasting_layout():
                 html.Label("Select Country:"),
                 dcc.Dropdown(
                     id='country-dropdown',
-                    options=country_options,
+                    options=country_options(),
                     placeholder='Select a country',
                     style={'margin-right': '10px', 'width': '300px'}
                 ),
                 html.Button(id='submit-button', n_clicks=0, children='Submit'),
+                html.Button(id='forecast-cancel-button', n_clicks=0, children='Cancel', disabled=True, style={'margin-left': '10px'}),
             ], style={'margin-bottom': '20px', 'display': 'flex'}),
+            html.Div(id='forecast-progress', style={'margin-bottom': '10px'}),
             html.Div(id='forecast-output', style={'display': 'flex'})
         ], style={'margin-left': '-170px', 'padding': '20px', 'backgroundColor': '#f5ebe0'})
     ], style={'display': 'flex', 'backgroundColor': '#f5ebe0'})
 
 # Function to register the callbacks for the forecasting page
 def register_forecasting_callbacks(app):
+    # Runs as a background job so a cold fit does not tie up a server worker
     @app.callback(
         Output('forecast-output', 'children'),
         Input('submit-button', 'n_clicks'),
-        State('country-dropdown', 'value')
+        State('country-dropdown', 'value'),
+        background=True,
+        progress=Output('forecast-progress', 'children'),
+        running=[
+            (Output('forecast-cancel-button', 'disabled'), False, True),
+        ],
+        cancel=[Input('forecast-cancel-button', 'n_clicks')],
+        prevent_initial_call=True
     )
-    def update_forecast(n_clicks, country):
+    def update_forecast(set_progress, n_clicks, country):
         if not n_clicks or not country:
             return ''
-        filtered_data = GDPdata[GDPdata['Country'] == country]
-        filtered_data = filtered_data[(filtered_data['Year'] >= 1950) & (filtered_data['Year'] <= 2018)]
-        
-        if filtered_data.empty:
-            return f"No data available for {country}."
-        
-        filtered_data = filtered_data[['Year', 'GDP per capita']]
-        filtered_data = filtered_data[filtered_data['GDP per capita'] != 0]
+        filtered_data = prepare_series(data.get('gdp'), country)
         
         if filtered_data.empty:
+            set_progress('')
             return f"No valid data available for {country} after filtering out zero values."
         
-        filtered_data.set_index('Year', inplace=True)
+        # Only one job per country at a time, other requests for it are dropped
+        job_key = f"gdp-forecast:{country}"
+        if not jobs.claim(job_key):
+            set_progress(f"A forecast for {country} is already being computed, please try again shortly.")
+            return no_update
         
         try:
-            # Determine the best ARIMA model order based on AIC
-            p = d = q = range(0, 3)
-            pdq = list(itertools.product(p, d, q))
-            aic_values = []
-
-            for param in pdq:
-                try:
-                    model = sm.tsa.ARIMA(filtered_data, order=param)
-                    results = model.fit()
-                    aic_values.append((param, results.aic))
-                except:
-                    continue
-
-            best_order = sorted(aic_values, key=lambda x: x[1])[0][0]
-            model = sm.tsa.ARIMA(filtered_data, order=best_order)
-            results = model.fit()
-            forecast = results.get_forecast(steps=10).predicted_mean
-            
-            future_years = pd.DataFrame({
-                'Year': range(filtered_data.index[-1] + 1, filtered_data.index[-1] + 11),
-                'GDP per capita': forecast
-            }).set_index('Year')
+            # Look up the precomputed forecast, fitting only if the country is missing or stale
+            set_progress(f"Looking up forecast for {country}...")
+            entry = forecast_store.get(
+                country, filtered_data,
+                progress=lambda done, total: set_progress(f"Fitting model {done}" + (f"/{total}" if total else ""))
+            )
+            future_years = forecast_frame(entry)
+            set_progress('Rendering chart...')
             
-            # Plotting
-            fig, ax = plt.subplots(figsize=(12, 8))
-            filtered_data.plot(ax=ax, label='Historical', color='blue')
-            future_years.plot(ax=ax, label='Forecast', linestyle='--', color='orange')
-            ax.set_title(f'GDP per Capita Forecast for {country}', fontsize=16)
-            ax.set_xlabel('Year')
-            ax.set_ylabel('GDP per Capita')
-            ax.legend()
-            ax.grid(True)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-
-            # Save plot to PNG and encode to base64
-            buf = BytesIO()
-            plt.savefig(buf, format='png')
-            buf.seek(0)
-            image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-            buf.close()
+            fig = build_forecast_figure(
+                filtered_data['GDP per capita'],
+                future_years['GDP per capita'],
+                title=f'GDP per Capita Forecast for {country}',
+                y_label='GDP per Capita',
+                lower=future_years['Lower'],
+                upper=future_years['Upper']
+            )
             
+            set_progress('')
             # Return the plot and forecasted data
-            return html.Div([
-                html.Div([
-                    html.Img(src='data:image/png;base64,{}'.format(image_base64)),
-                ], style={'flex': '2'}),
-                html.Div([
-                    html.H4('Forecasted GDP per Capita:', style={'margin-bottom': '10px', 'font-size': '18px'}),
-                    dcc.Markdown(future_years.to_markdown(index=True))
-                ], style={'flex': '1', 'padding-left': '20px'})
-            ], style={'display': 'flex', 'backgroundColor': '#f5ebe0'})
+            return forecast_panel(fig, 'Forecasted GDP per Capita:', future_years)
         except Exception as e:
+            set_progress('')
             return f"An error occurred while fitting the model or forecasting: {e}"
+        finally:
+            jobs.release(job_key)
@@ -0,0 +1,50 @@
+from dash import dcc, html
+import plotly.graph_objects as go
+
+
+# Build the forecast chart shared by the GDP and income forecast pages.
+# `history` and `forecast` are Series indexed by year, `lower`/`upper` the optional
+# confidence band around the forecast.
+def build_forecast_figure(history, forecast, title, y_label, lower=None, upper=None):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=history.index, y=history.values,
+        mode='lines', name='Historical', line=dict(color='blue')
+    ))
+    if lower is not None and upper is not None:
+        fig.add_trace(go.Scatter(
+            x=upper.index, y=upper.values,
+            mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=lower.index, y=lower.values,
+            mode='lines', line=dict(width=0), fill='tonexty',
+            fillcolor='rgba(255, 165, 0, 0.2)', name='95% interval', hoverinfo='skip'
+        ))
+    fig.add_trace(go.Scatter(
+        x=forecast.index, y=forecast.values,
+        mode='lines', name='Forecast', line=dict(color='orange', dash='dash')
+    ))
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=16)),
+        xaxis=dict(title='Year', showgrid=True, tickangle=-45),
+        yaxis=dict(title=y_label, showgrid=True),
+        height=800,
+        width=1200,
+        paper_bgcolor='#f5ebe0',
+        plot_bgcolor='white'
+    )
+    return fig
+
+
+# Chart on the left, forecast table on the right
+def forecast_panel(fig, table_title, table):
+    return html.Div([
+        html.Div([
+            dcc.Graph(figure=fig),
+        ], style={'flex': '2'}),
+        html.Div([
+            html.H4(table_title, style={'margin-bottom': '10px', 'font-size': '18px'}),
+            dcc.Markdown(table.to_markdown(index=True))
+        ], style={'flex': '1', 'padding-left': '20px'})
+    ], style={'display': 'flex', 'backgroundColor': '#f5ebe0'})
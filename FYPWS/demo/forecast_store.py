@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import config
+import data
+from arima_search import search_orders
+from model_select import select_model
+
+STORE_PATH = config.FORECAST_STORE
+# Seconds before the store lock of a process that died while saving is taken over
+LOCK_EXPIRE = 60
+
+FIRST_YEAR = 1950
+LAST_YEAR = 2018
+FORECAST_STEPS = 10
+
+
+# Select the historical GDP per capita series used for forecasting a country
+def prepare_series(GDPdata, country):
+    country_data = GDPdata[GDPdata['Country'] == country]
+    country_data = country_data[(country_data['Year'] >= FIRST_YEAR) & (country_data['Year'] <= LAST_YEAR)]
+    country_data = country_data[['Year', 'GDP per capita']]
+    country_data = country_data[country_data['GDP per capita'] != 0]
+    return country_data.set_index('Year')
+
+
+# Hash of a country's series, used to detect when the stored forecast is stale
+def series_hash(series):
+    years = np.asarray(series.index, dtype=np.int64)
+    values = np.asarray(series['GDP per capita'], dtype=np.float64)
+    digest = hashlib.sha256()
+    digest.update(years.tobytes())
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+# Search the candidate ARIMA orders, pick the one with the lowest AIC and forecast with it
+def grid_forecast(series, steps=FORECAST_STEPS, progress=None):
+    import statsmodels.api as sm
+
+    search = search_orders(series['GDP per capita'], progress=progress)
+    if search.best_order is None:
+        reasons = '; '.join(f"{order}: {reason}" for order, reason in search.failed)
+        raise ValueError(f"no ARIMA order could be fitted ({reasons})")
+
+    # Fitted on the plain values like the order search: statsmodels cannot forecast from a
+    # year index, and the forecast years are numbered from the last year below
+    values = series['GDP per capita'].to_numpy(dtype=np.float64)
+    results = sm.tsa.ARIMA(values, order=search.best_order).fit()
+    prediction = results.get_forecast(steps=steps)
+    conf_int = np.asarray(prediction.conf_int())
+
+    last_year = int(series.index[-1])
+    return {
+        'search': 'grid',
+        'model': f"ARIMA({','.join(map(str, search.best_order))})",
+        'order': list(search.best_order),
+        'aic_table': search.aic_table(),
+        'failed_orders': [[list(order), reason] for order, reason in search.failed],
+        'years': list(range(last_year + 1, last_year + steps + 1)),
+        'forecast': [float(v) for v in np.asarray(prediction.predicted_mean)],
+        'lower': [float(v) for v in conf_int[:, 0]],
+        'upper': [float(v) for v in conf_int[:, 1]],
+    }
+
+
+# Baselines and the stepwise ARIMA search of model_select, forecasting with the selected model
+def stepwise_forecast(series, steps=FORECAST_STEPS, progress=None):
+    selection = select_model(
+        series['GDP per capita'],
+        progress=None if progress is None else lambda fits: progress(fits, None)
+    )
+    forecast, lower, upper = selection.forecast(steps)
+
+    last_year = int(series.index[-1])
+    return {
+        'search': 'stepwise',
+        'model': selection.best.label,
+        'order': list(selection.order) if selection.order else None,
+        'ic_table': [[label, ic] for label, ic in selection.table],
+        'failed_models': [[label, reason] for label, reason in selection.failed],
+        'years': list(range(last_year + 1, last_year + steps + 1)),
+        'forecast': [float(v) for v in forecast],
+        'lower': [float(v) for v in lower],
+        'upper': [float(v) for v in upper],
+    }
+
+
+SEARCHES = {'grid': grid_forecast, 'stepwise': stepwise_forecast}
+
+
+# Forecast a country's series with the model selection set by FYP_FORECAST_SEARCH
+def fit_forecast(series, steps=FORECAST_STEPS, progress=None, search=None):
+    return SEARCHES[search or config.FORECAST_SEARCH](series, steps=steps, progress=progress)
+
+
+# Turn a stored entry back into the forecast table shown on the page
+def forecast_frame(entry):
+    return pd.DataFrame({
+        'Year': entry['years'],
+        'GDP per capita': entry['forecast'],
+        'Lower': entry['lower'],
+        'Upper': entry['upper'],
+    }).set_index('Year')
+
+
+def load_store(path=STORE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Written to a temporary file of its own and moved into place, so concurrent writers
+# (server workers, background jobs, the build step) never share a partial file
+def save_store(store, path=STORE_PATH):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(store, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+_lock_cache = None
+
+
+# Lock held while a process rereads, updates and writes the store file, kept in the jobs
+# cache directory that the server, its background jobs and the build step share
+def store_lock(path=STORE_PATH):
+    import diskcache
+
+    global _lock_cache
+    if _lock_cache is None:
+        _lock_cache = diskcache.Cache(config.JOBS_DIR)
+    return diskcache.Lock(_lock_cache, f"forecast-store:{os.path.abspath(path)}", expire=LOCK_EXPIRE)
+
+
+class ForecastStore:
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.reload()
+
+    def reload(self):
+        self.mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        self.entries = load_store(self.path)
+
+    # Pick up entries written by other processes (build step, background jobs)
+    def refresh(self):
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if mtime != self.mtime:
+            self.reload()
+
+    # Stored entry for a country, or None when missing, fitted on a different series or
+    # selected by another search
+    def lookup(self, country, series):
+        self.refresh()
+        entry = self.entries.get(country)
+        if entry is None or entry['hash'] != series_hash(series) or entry.get('search', 'grid') != config.FORECAST_SEARCH:
+            return None
+        return entry
+
+    # Write entries to the store file. Other processes write it too, so the file is reread
+    # and the entries merged into it under the store lock, and no process loses another's fits.
+    def save(self, entries):
+        with store_lock(self.path):
+            self.reload()
+            self.entries.update(entries)
+            save_store(self.entries, self.path)
+            self.mtime = os.path.getmtime(self.path)
+
+    # Fit one country and keep the result in the store
+    def fit(self, country, series, save=True, progress=None):
+        entry = fit_forecast(series, progress=progress)
+        entry['hash'] = series_hash(series)
+        self.entries[country] = entry
+        if save:
+            self.save({country: entry})
+        return entry
+
+    def get(self, country, series, progress=None):
+        entry = self.lookup(country, series)
+        if entry is None:
+            entry = self.fit(country, series, progress=progress)
+        return entry
+
+    # Fit every country whose series changed since the last build
+    def build(self, GDPdata, verbose=False):
+        fitted, skipped, failed = [], [], []
+        for country in GDPdata['Country'].unique():
+            series = prepare_series(GDPdata, country)
+            if series.empty:
+                continue
+            if self.lookup(country, series) is not None:
+                skipped.append(country)
+                continue
+            try:
+                self.fit(country, series, save=False)
+                fitted.append(country)
+            except Exception as e:
+                failed.append((country, str(e)))
+            if verbose:
+                print(f"{country}: {'failed' if failed and failed[-1][0] == country else 'fitted'}")
+        self.save({country: self.entries[country] for country in fitted})
+        return fitted, skipped, failed
+
+
+# Build step: python forecast_store.py [GDPmap.csv]
+if __name__ == '__main__':
+    GDPdata = pd.read_csv(sys.argv[1]) if len(sys.argv) > 1 else data.get('gdp')
+    store = ForecastStore()
+    fitted, skipped, failed = store.build(GDPdata, verbose=True)
+    print(f"Fitted {len(fitted)} countries, {len(skipped)} unchanged, {len(failed)} failed")
+    for country, reason in failed:
+        print(f"  {country}: {reason}")
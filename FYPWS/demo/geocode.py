@@ -0,0 +1,208 @@
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# Offline geocoding for the ETL pipeline.
+#
+# Lookups are keyed by a normalized (country, sub-national region) pair, de-duplicated
+# and resolved in bulk from, in order:
+#   1. the bundled point table (region_coordinates.csv, the points geocoded for the
+#      notebook, with an empty region for the country's own point)
+#   2. the persistent lookup table of earlier network results (geocode_cache.csv)
+#   3. the network (Nominatim through geopy), only when FYP_GEOCODE_NETWORK=1
+#   4. the country's point from the bundled table, or its centroid from the bundled
+#      country_centroids.csv when it has none
+# Bundled points that lie implausibly far from their country are rejected, since the
+# notebook geocoded region names without their country (Bangladesh landed in Kenya,
+# regions of Uzbekistan in Fiji and Hong Kong). Rows whose point was rejected fall back
+# to their country's point; when a country has several such regions they are spread on a
+# small circle around it, so their map markers do not stack.
+#
+# country_centroids.csv is derived from the countryinfo package data (MIT licensed).
+
+COUNTRY_TABLE = os.path.join(config.RAW_ROOT, 'country_centroids.csv')
+REGION_TABLE = os.path.join(config.RAW_ROOT, 'region_coordinates.csv')
+
+# Country names used by the datasets that neither the name nor the aliases in
+# country_centroids.csv cover
+ALIASES = {
+    'congo democratic republic': 'COD',
+    'cote divoire': 'CIV',
+    'korea north': 'PRK',
+    'korea south': 'KOR',
+    'macao': 'MAC',
+    'macedonia': 'MKD',
+    'micronesia': 'FSM',
+    'macedonia the former yugoslav republic of': 'MKD',
+    'palestine state ofa': 'PSE',
+    'swaziland': 'SWZ',
+}
+
+# Regions with these names stand for the whole country
+NO_REGION = {'', 'unknown', '0'}
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def normalize(text):
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return ''
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    text = text.replace("'", '')
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+
+
+class Geocoder:
+    def __init__(self, cache_path=None, network=None):
+        self.cache_path = cache_path or config.GEOCODE_CACHE
+        self.network = config.GEOCODE_NETWORK if network is None else network
+        self._geolocator = None
+        self._load_countries()
+        self._load_regions()
+        self._load_cache()
+        self.counts = {}
+
+    def _load_countries(self):
+        countries = pd.read_csv(COUNTRY_TABLE, keep_default_na=False, na_values={'Area': ['']})
+        self.centroids = {row.Code: (float(row.Latitude), float(row.Longitude)) for row in countries.itertuples()}
+        self.names = {row.Code: row.Country for row in countries.itertuples()}
+        # A point can be this far from the centroid: twice the radius of a disc with the
+        # country's area, and never less than 300 km for small countries
+        radius = np.sqrt(countries['Area'].fillna(0).to_numpy() / np.pi)
+        self.max_km = dict(zip(countries['Code'], np.maximum(300.0, 2 * radius)))
+        self.radius_km = dict(zip(countries['Code'], radius))
+
+        self.codes = {}
+        for row in countries.itertuples():
+            self.codes[normalize(row.Code)] = row.Code
+            self.codes[normalize(row.Country)] = row.Code
+        for row in countries.itertuples():
+            for alias in row.Aliases.split('|') if row.Aliases else []:
+                self.codes.setdefault(normalize(alias), row.Code)
+        self.codes.update(ALIASES)
+
+    def _load_regions(self):
+        regions = pd.read_csv(REGION_TABLE, keep_default_na=False)
+        codes = regions['Country'].map(lambda name: self.country_code(name))
+        self.regions = {}
+        self.rejected = 0
+        for code, region, lat, lon in zip(codes, regions['Sub-national region'], regions['Latitude'],
+                                          regions['Longitude']):
+            point = (float(lat), float(lon))
+            if code is None or not self.plausible(code, point):
+                self.rejected += 1
+                continue
+            self.regions[(code, normalize(region))] = point
+
+    def _load_cache(self):
+        self.cache = {}
+        if os.path.exists(self.cache_path):
+            cache = pd.read_csv(self.cache_path, keep_default_na=False, na_values={'Latitude': [''], 'Longitude': ['']})
+            for row in cache.itertuples():
+                self.cache[(row.country, row.region)] = (row.Latitude, row.Longitude, row.source)
+
+    def save_cache(self):
+        rows = [(country, region, lat, lon, source) for (country, region), (lat, lon, source) in sorted(self.cache.items())]
+        pd.DataFrame(rows, columns=['country', 'region', 'Latitude', 'Longitude', 'source']) \
+            .to_csv(self.cache_path, index=False)
+
+    def country_code(self, name, code=None):
+        if code and code in self.centroids:
+            return code
+        return self.codes.get(normalize(name))
+
+    def plausible(self, code, point):
+        centroid = self.centroids[code]
+        return haversine_km(centroid[0], centroid[1], point[0], point[1]) <= self.max_km[code]
+
+    def _network_lookup(self, code, region):
+        if self._geolocator is None:
+            from geopy.extra.rate_limiter import RateLimiter
+            from geopy.geocoders import Nominatim
+            geolocator = Nominatim(user_agent='fypws-etl')
+            # Nominatim's usage policy allows one request per second
+            self._geolocator = RateLimiter(geolocator.geocode, min_delay_seconds=1, max_retries=2)
+        location = self._geolocator(f"{region}, {self.names[code]}")
+        if location is None:
+            return None
+        point = (location.latitude, location.longitude)
+        return point if self.plausible(code, point) else None
+
+    # Resolve one normalized key to (latitude, longitude, source)
+    def _resolve_one(self, code, region_key, region):
+        if code is None:
+            return np.nan, np.nan, 'unknown country'
+        if region_key not in NO_REGION:
+            point = self.regions.get((code, region_key))
+            if point is not None:
+                return point[0], point[1], 'table'
+            cached = self.cache.get((code, region_key))
+            if cached is not None and cached[2] == 'network':
+                return cached
+            if self.network and cached is None:
+                point = self._network_lookup(code, region)
+                if point is not None:
+                    self.cache[(code, region_key)] = (point[0], point[1], 'network')
+                    return point[0], point[1], 'network'
+                self.cache[(code, region_key)] = (np.nan, np.nan, 'miss')
+        point = self.regions.get((code, ''))
+        if point is not None:
+            return point[0], point[1], 'country'
+        centroid = self.centroids[code]
+        return centroid[0], centroid[1], 'centroid'
+
+    # Place the regions of a country that fell back to its point on a circle around it, a
+    # quarter of the country's radius (at least 10 km) away
+    def _spread(self, code, resolved, positions):
+        if len(positions) < 2:
+            return
+        distance = max(10.0, self.radius_km.get(code, 0.0) / 4)
+        for k, position in enumerate(positions):
+            lat, lon, source = resolved[position]
+            angle = 2 * np.pi * k / len(positions)
+            dlat = distance * np.cos(angle) / 111.0
+            dlon = distance * np.sin(angle) / (111.0 * max(np.cos(np.radians(lat)), 0.1))
+            resolved[position] = (lat + dlat, lon + dlon, source)
+
+    # Coordinates for every row: a frame with Latitude, Longitude and Source aligned
+    # with `countries`. Each distinct (country, region) is looked up once.
+    def resolve(self, countries, regions=None, codes=None):
+        countries = pd.Series(countries).reset_index(drop=True)
+        regions = pd.Series([''] * len(countries) if regions is None else regions).reset_index(drop=True)
+        codes = pd.Series([''] * len(countries) if codes is None else codes).reset_index(drop=True).fillna('')
+
+        keys = pd.DataFrame({'country': countries, 'region': regions.fillna(''), 'code': codes})
+        unique = keys.drop_duplicates()
+        resolved = []
+        fallbacks = {}  # country code -> positions in `resolved` of regions placed at the country's point
+        for row in unique.itertuples(index=False):
+            code = self.country_code(row.country, row.code)
+            region_key = normalize(row.region)
+            resolved.append(self._resolve_one(code, region_key, row.region))
+            if region_key not in NO_REGION and resolved[-1][2] in ('country', 'centroid'):
+                fallbacks.setdefault(code, []).append(len(resolved) - 1)
+        for code, positions in fallbacks.items():
+            self._spread(code, resolved, positions)
+        unique = unique.assign(
+            Latitude=[r[0] for r in resolved],
+            Longitude=[r[1] for r in resolved],
+            Source=[r[2] for r in resolved],
+        )
+        if self.network:
+            self.save_cache()
+
+        result = keys.merge(unique, on=['country', 'region', 'code'], how='left')
+        for source, count in result['Source'].value_counts().items():
+            self.counts[source] = self.counts.get(source, 0) + int(count)
+        return result[['Latitude', 'Longitude', 'Source']]
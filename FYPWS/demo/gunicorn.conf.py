@@ -0,0 +1,15 @@
+# Imported under another name, gunicorn reads `config` as one of its own settings
+import config as fyp_config
+
+# gunicorn settings for the production server, run from this directory:
+#   gunicorn -c gunicorn.conf.py
+# FYP_BIND, FYP_WORKERS and FYP_DATA_ROOT (see config.py) configure it.
+wsgi_app = 'wsgi:server'
+bind = fyp_config.BIND
+workers = fyp_config.WORKERS
+
+# Load the app and its datasets in the master, before the workers are forked
+preload_app = True
+
+# Cold figure builds and forecast lookups can take a few seconds
+timeout = 120
@@ -1,12 +1,13 @@
 from dash import dcc, html
 import dash_bootstrap_components as dbc
-import pandas as pd
+import config
+import poverty_index
+import prerender
 import plotly.express as px
 from sidebar import sidebar
 
-# Sample DataFrame with normalized data
-data = pd.read_csv("C:/Users/William/Documents/FYPWS/demo/complete_data.csv")
-df = pd.DataFrame(data)
+# Rankings are ranked over the countries where none of these columns is 0
+RANKING_FILTER = poverty_index.INDICATORS + ['Poverty Index']
 
 def home_layout():
     return html.Div([
@@ -32,7 +33,7 @@ def home_layout():
                             value='Poverty Index',  # Default value
                             style={'width': '1600px', 'margin': '0 auto'}
                         ),
-                        dcc.Graph(id='bar-plot', style={'width': '100%', 'height': '600px'})
+                        dcc.Graph(id='bar-plot', figure=initial_figure(), style={'width': '100%', 'height': '600px'})
                     ], style={'textAlign': 'center'})
                 ], width=12),
             ], style={'padding': '0px', 'backgroundColor': '#f5ebe0', 'borderRadius': '10px', 'textAlign': 'center'})
@@ -40,25 +41,18 @@ def home_layout():
     ], style={'display': 'flex', 'width': '100%', 'margin': '0', 'padding': '0', 'backgroundColor': '#f5ebe0'})
 
 # Define the callback to update the graph based on the selected metric
-def update_graph(selected_metric):  
-    # Filter out countries where any of the columns have a value of 0
-    non_zero_countries = df[(df['Median Salary'] > 0) & 
-                            (df['Inequality in Income'] > 0) & 
-                            (df['GDP per capita'] > 0) & 
-                            (df['Intensity of Deprivation Urban'] > 0) & 
-                            (df['Intensity of Deprivation Rural'] > 0) & 
-                            (df['Poverty Index'] > 0)]
-    
-    # Sort by the selected metric and select top 10
-    top_10_countries = non_zero_countries.sort_values(by=selected_metric, ascending=False).head(10)
+def update_graph(selected_metric, n=config.RANKING_N):
+    # Top n countries by the selected metric, sliced from the rankings of the current
+    # Poverty Index values (rebuilt only when the index engine was updated)
+    top_countries = poverty_index.rankings(RANKING_FILTER).top(selected_metric, n)
     
     # Create the plot
     fig = px.bar(
-        top_10_countries,
+        top_countries,
         x=selected_metric,
         y='Country',
         orientation='h',
-        title=f'Top 10 Countries by Normalized {selected_metric}',
+        title=f'Top {n} Countries by Normalized {selected_metric}',
         labels={selected_metric: selected_metric, 'Country': 'Country'},
         color=selected_metric
     )
@@ -69,3 +63,18 @@ def update_graph(selected_metric):
         font=dict(color='black')  # Text color (optional, to improve readability)
     )
     return fig
+
+# What the callback returns for the default metric, shipped in the layout
+def default_figure():
+    return update_graph('Poverty Index').to_dict()
+
+# What the default figure depends on besides complete_data.csv, part of its prerender key:
+# the index weights (FYP_POVERTY_WEIGHTS), updates made to the index since it was loaded
+# and the number of countries shown
+def figure_settings():
+    engine = poverty_index.get()
+    return {'weights': dict(engine.weights), 'index_version': engine.version, 'ranking_n': config.RANKING_N}
+
+# The prerendered bar plot, rebuilt when the weights or the index change
+def initial_figure():
+    return prerender.figure('home')
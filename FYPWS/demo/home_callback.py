@@ -5,10 +5,8 @@ from dash.dependencies import Input, Output
 
 import plotly.express as px
 import dash
-import pandas as pd
-
-data = pd.read_csv("C:/Users/William/Documents/FYPWS/demo/complete_data.csv")
-df = pd.DataFrame(data)
+import config
+import poverty_index
 
 def register_callbacks(app):
     @app.callback(
@@ -16,23 +14,18 @@ def register_callbacks(app):
         [Input('metric-dropdown', 'value')]
     )
     def update_graph(selected_metric):
-        # Filter out countries where any of the columns have a value of 0
-        non_zero_countries = df[(df['Median Salary'] > 0) & 
-                                (df['Inequality in Income'] > 0) & 
-                                (df['GDP per capita'] > 0) & 
-                                (df['Intensity of Deprivation Urban'] > 0) & 
-                                (df['Intensity of Deprivation Rural'] > 0)]
-        
-        # Sort by the selected metric and select bottom 10
-        bottom_10_countries = non_zero_countries.sort_values(by=selected_metric, ascending=True).head(10)
+        # Bottom countries by the selected metric, over the countries where none of the
+        # input columns is 0, from the current Poverty Index values
+        rankings = poverty_index.rankings(poverty_index.INDICATORS)
+        bottom_countries = rankings.bottom(selected_metric, config.RANKING_N)
         
         # Create the plot
         fig = px.bar(
-            bottom_10_countries,
+            bottom_countries,
             x=selected_metric,
             y='Country',
             orientation='h',
-            title=f'Bottom 10 Countries by {selected_metric}',
+            title=f'Bottom {config.RANKING_N} Countries by {selected_metric}',
             labels={selected_metric: selected_metric, 'Country': 'Country'},
             color=selected_metric
         )
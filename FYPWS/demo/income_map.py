@@ -1,33 +1,18 @@
 from dash import dcc, html
 import plotly.express as px
-import pandas as pd
-from dash.dependencies import Input, Output
+import data
+import prerender
+from dash.dependencies import Input, Output, State
+from figure_cache import cached_figure
+from figures import with_projection, register_projection_toggle, slim_figure
 from sidebar import sidebar
 
-# Load the data
-income_transformed = pd.read_csv("C:/Users/William/Documents/FYPWS/demo/incomeMap.csv")
+# Data for years 2010 to 2021, filtered on first use
+@data.derived('income')
+def income_rows(income_transformed):
+    return income_transformed[(income_transformed['Year'] >= 2010) & (income_transformed['Year'] <= 2021)]
 
-# Filter data for years 2010 to 2021
-filtered_data2 = income_transformed[(income_transformed['Year'] >= 2010) & (income_transformed['Year'] <= 2021)]
-
-# Create the choropleth map
-figIncome = px.choropleth(
-    filtered_data2,
-    locations='Code',  # Use 'Code' as the identifier for countries
-    color='Value',
-    animation_frame='Year',  # Animate over years
-    hover_name='Country',  # Label countries on hover
-    hover_data={
-        'Human Development Groups': True,
-        'HDI Rank (2021)': True,
-        'Value': True,
-        'Year': False  # Hide Year in hover as it's already shown in animation frame
-    },
-    range_color=[filtered_data2['Value'].min(), filtered_data2['Value'].max()],  # Adjust color scale
-    projection='natural earth',
-    title='Inequality in Income by Country (2010-2021)',
-    labels={'Value': 'Inequality in Income'}
-)
+DEFAULT_PROJECTION = 'natural earth'
 
 def income_map_layout():
     return html.Div([
@@ -36,7 +21,7 @@ def income_map_layout():
             html.H2("Inequality in Income World Map"),
             dcc.Dropdown(
                 id='country-search-dropdown-income',
-                options=[{'label': country, 'value': country} for country in filtered_data2['Country'].unique()],
+                options=[{'label': country, 'value': country} for country in income_rows()['Country'].unique()],
                 placeholder='Select a country',
                 style={'width': '35%'}  # Make dropdown menu narrower
             ),
@@ -52,84 +37,101 @@ def income_map_layout():
             ),
             dcc.Graph(
                 id='income-map',
-                figure=figIncome,  # Set the figure directly
+                figure=prerender.figure('income-map'),  # Default view, serialized by prerender.py
                 style={'width': '80%', 'height': '800px'}  # Make plot wider and taller
             )
         ], style={'marginLeft': '-170px', 'width': 'calc(100% - 250px)'})  # Adjusting the left margin and width for the main content
     ], style={'display': 'flex'})
 
+# The animated figure for a country filter (None for all countries) is built once and
+# cached, the projection is applied per request
+@cached_figure('income_map', datasets=('income',))
+def build_income_map(selected_country):
+    filtered_data2 = income_rows()
+    # Create animated choropleth map
+    if selected_country:
+        filtered_country_data = filtered_data2[filtered_data2['Country'] == selected_country]
+        figIncomeDash = px.choropleth(
+            filtered_country_data,  # Use the filtered dataset for animation
+            locations='Code',  # Use 'Code' as the identifier for countries
+            color='Value',
+            animation_frame='Year',  # Animate over years
+            hover_name='Country',  # Label countries on hover
+            hover_data={
+                'Human Development Groups': True,
+                'HDI Rank (2021)': True,
+                'Value': True,
+                'Year': False  # Hide Year in hover as it's already shown in animation frame
+            },
+            range_color=[filtered_country_data['Value'].min(), filtered_country_data['Value'].max()],  # Adjust color scale
+            projection=DEFAULT_PROJECTION,  # The callback applies the selected projection
+            title=f'Inequality in Income of {selected_country} (2010-2021)',
+            labels={'Value': 'Inequality in Income'}
+        )
+    else:
+        figIncomeDash = px.choropleth(
+            filtered_data2,  # Use the full dataset for animation
+            locations='Code',  # Use 'Code' as the identifier for countries
+            color='Value',
+            animation_frame='Year',  # Animate over years
+            hover_name='Country',  # Label countries on hover
+            hover_data={
+                'Human Development Groups': True,
+                'HDI Rank (2021)': True,
+                'Value': True,
+                'Year': False  # Hide Year in hover as it's already shown in animation frame
+            },
+            range_color=[filtered_data2['Value'].min(), filtered_data2['Value'].max()],  # Adjust color scale
+            projection=DEFAULT_PROJECTION,  # The callback applies the selected projection
+            title='Inequality in Income by Country (2010-2021)',
+            labels={'Value': 'Inequality in Income'}
+        )
+    
+    # Update layout to match the example
+    figIncomeDash.update_layout(
+        title={
+            'text': 'Inequality in Income by Country (2010-2021)',
+            'y': 0.9,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        },
+        geo=dict(
+            showframe=True,
+            showcoastlines=True,
+            coastlinecolor='black',
+            projection_type=DEFAULT_PROJECTION,
+            bgcolor='#f5ebe0'
+        ),
+        coloraxis_colorbar=dict(
+            title='Inequality in Income',
+            tickprefix='%',
+            titlefont=dict(size=14),
+            tickfont=dict(size=12)
+        ),
+        paper_bgcolor='#f5ebe0',
+        plot_bgcolor='#f5ebe0',
+        height=800,
+        width=1600
+    )
+
+    return slim_figure(figIncomeDash.to_dict())
+
+# What the callback returns for the page's initial values, shipped in the layout
+def default_figure():
+    return with_projection(build_income_map(None), DEFAULT_PROJECTION)
+
 def register_callbacks(app):
+    # A projection change is made in the browser, only a new country goes to the server.
+    # The layout already holds the default figure, so there is no initial call.
     @app.callback(
         Output('income-map', 'figure'),
-        [Input('country-search-dropdown-income', 'value'),
-         Input('projection-dropdown-income', 'value')]
+        [Input('country-search-dropdown-income', 'value')],
+        [State('projection-dropdown-income', 'value')],
+        prevent_initial_call=True
     )
     def update_income_map(selected_country, selected_projection):
-        # Create animated choropleth map
-        if selected_country:
-            filtered_country_data = filtered_data2[filtered_data2['Country'] == selected_country]
-            figIncomeDash = px.choropleth(
-                filtered_country_data,  # Use the filtered dataset for animation
-                locations='Code',  # Use 'Code' as the identifier for countries
-                color='Value',
-                animation_frame='Year',  # Animate over years
-                hover_name='Country',  # Label countries on hover
-                hover_data={
-                    'Human Development Groups': True,
-                    'HDI Rank (2021)': True,
-                    'Value': True,
-                    'Year': False  # Hide Year in hover as it's already shown in animation frame
-                },
-                range_color=[filtered_country_data['Value'].min(), filtered_country_data['Value'].max()],  # Adjust color scale
-                projection=selected_projection,  # Apply the selected projection type
-                title=f'Inequality in Income of {selected_country} (2010-2021)',
-                labels={'Value': 'Inequality in Income'}
-            )
-        else:
-            figIncomeDash = px.choropleth(
-                filtered_data2,  # Use the full dataset for animation
-                locations='Code',  # Use 'Code' as the identifier for countries
-                color='Value',
-                animation_frame='Year',  # Animate over years
-                hover_name='Country',  # Label countries on hover
-                hover_data={
-                    'Human Development Groups': True,
-                    'HDI Rank (2021)': True,
-                    'Value': True,
-                    'Year': False  # Hide Year in hover as it's already shown in animation frame
-                },
-                range_color=[filtered_data2['Value'].min(), filtered_data2['Value'].max()],  # Adjust color scale
-                projection=selected_projection,  # Apply the selected projection type
-                title='Inequality in Income by Country (2010-2021)',
-                labels={'Value': 'Inequality in Income'}
-            )
-        
-        # Update layout to match the example
-        figIncomeDash.update_layout(
-            title={
-                'text': 'Inequality in Income by Country (2010-2021)',
-                'y': 0.9,
-                'x': 0.5,
-                'xanchor': 'center',
-                'yanchor': 'top'
-            },
-            geo=dict(
-                showframe=True,
-                showcoastlines=True,
-                coastlinecolor='black',
-                projection_type=selected_projection,  # Apply the selected projection type
-                bgcolor='#f5ebe0'
-            ),
-            coloraxis_colorbar=dict(
-                title='Inequality in Income',
-                tickprefix='%',
-                titlefont=dict(size=14),
-                tickfont=dict(size=12)
-            ),
-            paper_bgcolor='#f5ebe0',
-            plot_bgcolor='#f5ebe0',
-            height=800,
-            width=1600
-        )
+        return with_projection(build_income_map(selected_country), selected_projection)
+
+    register_projection_toggle(app, 'income-map', 'projection-dropdown-income')
 
-        return figIncomeDash
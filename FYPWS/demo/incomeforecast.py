@@ -1,22 +1,28 @@
-from dash import dcc, html
+from dash import dcc, html, dash_table, no_update
 from dash.dependencies import Input, Output, State
-import pandas as pd
-import matplotlib.pyplot as plt
-from io import BytesIO
-import base64
-import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
+import plotly.express as px
+import data
+import batch_forecast
+from figure_cache import cached_figure
 from sidebar import sidebar
+from forecast_figure import build_forecast_figure, forecast_panel
+import jobs
 
-# Load the income dataset
-income_dataset = pd.read_csv("incomeMap.csv")
+# Unique country names for the dropdown, extracted on first use
+@data.derived('income')
+def country_options(income_dataset):
+    return [{'label': country, 'value': country} for country in income_dataset['Country'].unique()]
 
-# Extract unique country names for the dropdown
-country_options = [{'label': country, 'value': country} for country in income_dataset['Country'].unique()]
+# Years after the data covered by the all-countries forecast. The batch fit runs the
+# first time the page is opened.
+@data.derived('income')
+def forecast_years(income_dataset):
+    return [int(year) for year in sorted(batch_forecast.income_forecasts()['Year'].unique())
+            if year > income_dataset['Year'].max()]
 
 # Function to create the forecasting layout
 def incForecasting_layout():
+    years = forecast_years()
     return html.Div([
         sidebar(),
         html.Div([
@@ -25,28 +31,87 @@ def incForecasting_layout():
                 html.Label("Select Country:"),
                 dcc.Dropdown(
                     id='country-dropdown',
-                    options=country_options,
+                    options=country_options(),
                     placeholder='Select a country',
                     style={'margin-right': '10px', 'width': '300px'}
                 ),
                 html.Button(id='submit-button', n_clicks=0, children='Submit'),
+                html.Button(id='inc-forecast-cancel-button', n_clicks=0, children='Cancel', disabled=True, style={'margin-left': '10px'}),
             ], style={'margin-bottom': '20px', 'display': 'flex'}),
-            html.Div(id='inc-forecast-output', style={'display': 'flex'})
+            html.Div(id='inc-forecast-progress', style={'margin-bottom': '10px'}),
+            html.Div(id='inc-forecast-output', style={'display': 'flex'}),
+            html.H3("All Countries Forecast"),
+            dcc.Dropdown(
+                id='inc-forecast-year-dropdown',
+                options=[{'label': str(year), 'value': year} for year in years],
+                value=years[-1],
+                clearable=False,
+                style={'width': '300px'}
+            ),
+            dcc.Graph(id='inc-forecast-map', style={'height': '600px'}),
+            dash_table.DataTable(
+                id='inc-forecast-table',
+                columns=[{'name': name, 'id': name} for name in ['Country', 'Value', 'Lower', 'Upper']],
+                sort_action='native',
+                filter_action='native',
+                page_size=15
+            )
         ], style={'margin-left': '-170px', 'padding': '20px', 'backgroundColor': '#f5ebe0'})
     ], style={'display': 'flex', 'backgroundColor': '#f5ebe0'})
 
+# Forecast of every country for one year, from the batch fit
+def year_forecasts(year):
+    forecasts = batch_forecast.income_forecasts()
+    rows = forecasts[forecasts['Year'] == year].drop(columns='Year')
+    codes = data.get('income').drop_duplicates('Country')[['Country', 'Code']]
+    return rows.merge(codes, on='Country', how='left')
+
+@cached_figure('inc_forecast_map', datasets=('income',))
+def build_forecast_map(year):
+    fig = px.choropleth(
+        year_forecasts(year),
+        locations='Code',
+        color='Value',
+        hover_name='Country',
+        hover_data={'Lower': ':.2f', 'Upper': ':.2f', 'Code': False},
+        projection='natural earth',
+        title=f'Forecasted Inequality in Income ({year})',
+        labels={'Value': 'Inequality in Income'}
+    )
+    fig.update_layout(paper_bgcolor='#f5ebe0')
+    return fig.to_dict()
+
 # Function to register the callbacks for the forecasting page
 def inc_register_forecasting_callbacks(app):
+    @app.callback(
+        [Output('inc-forecast-map', 'figure'),
+         Output('inc-forecast-table', 'data')],
+        [Input('inc-forecast-year-dropdown', 'value')]
+    )
+    def update_all_forecasts(year):
+        rows = year_forecasts(year)[['Country', 'Value', 'Lower', 'Upper']].round(2)
+        return build_forecast_map(year), rows.to_dict('records')
+
+    # Runs as a background job so rendering does not tie up a server worker
     @app.callback(
         Output('inc-forecast-output', 'children'),
         Input('submit-button', 'n_clicks'),
-        State('country-dropdown', 'value')
+        State('country-dropdown', 'value'),
+        background=True,
+        progress=Output('inc-forecast-progress', 'children'),
+        running=[
+            (Output('inc-forecast-cancel-button', 'disabled'), False, True),
+        ],
+        cancel=[Input('inc-forecast-cancel-button', 'n_clicks')],
+        prevent_initial_call=True
     )
-    def update_inc_forecast(n_clicks, country):
+    def update_inc_forecast(set_progress, n_clicks, country):
         if not n_clicks or not country:
             return ''
+        income_dataset = data.get('income')
         df_country = income_dataset[income_dataset['Country'] == country]
         if df_country.empty:
+            set_progress('')
             return f"No data available for {country}."
         
         df_country = df_country[['Year', 'Value']]
@@ -54,60 +119,35 @@ def inc_register_forecasting_callbacks(app):
         df_country = df_country[df_country['Value'] != 0]
         
         if df_country.empty:
+            set_progress('')
             return f"No valid data available for {country} after filtering out zero values."
         
+        # Only one job per country at a time, other requests for it are dropped
+        job_key = f"income-forecast:{country}"
+        if not jobs.claim(job_key):
+            set_progress(f"A forecast for {country} is already being computed, please try again shortly.")
+            return no_update
+        
         try:
-            # Prepare data for Polynomial Regression
-            X = df_country.index.values.reshape(-1, 1)
-            y = df_country['Value'].values
-            
-            # Create polynomial features
-            poly = PolynomialFeatures(degree=2)
-            X_poly = poly.fit_transform(X)
-            
-            # Create and fit the model
-            model2BestLR = LinearRegression()
-            model2BestLR.fit(X_poly, y)
-            
-            # Forecast the next 10 years
-            future_years = np.arange(df_country.index[-1] + 1, df_country.index[-1] + 11).reshape(-1, 1)
-            future_years_poly = poly.transform(future_years)
-            forecast = model2BestLR.predict(future_years_poly)
-            
-            # Create a DataFrame for future dates
-            future_df = pd.DataFrame({
-                'Year': future_years.flatten(),
-                'Value': forecast
-            }).set_index('Year')
-            
-            # Plotting
-            fig, ax = plt.subplots(figsize=(14, 8))
-            df_country.plot(ax=ax, label='Historical Data', color='blue')
-            future_df.plot(ax=ax, label='Forecast', linestyle='--', color='orange')
-            ax.set_title(f'Income Forecast for {country}', fontsize=16)
-            ax.set_xlabel('Year', fontsize=14)
-            ax.set_ylabel('Income Value', fontsize=14)
-            ax.legend()
-            ax.grid(True)
-            plt.xticks(np.arange(df_country.index.min(), future_df.index.max() + 1, 5), rotation=45)
-            plt.tight_layout()
+            set_progress(f"Looking up forecast for {country}...")
+            # Taken from the batch fit of every country (polynomial trend of degree 2)
+            future_df = batch_forecast.country_forecast(country)
             
-            # Save plot to PNG and encode to base64
-            buf = BytesIO()
-            plt.savefig(buf, format='png')
-            buf.seek(0)
-            image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-            buf.close()
+            set_progress('Rendering chart...')
+            fig = build_forecast_figure(
+                df_country['Value'],
+                future_df['Value'],
+                title=f'Income Forecast for {country}',
+                y_label='Income Value',
+                lower=future_df['Lower'],
+                upper=future_df['Upper']
+            )
             
+            set_progress('')
             # Return the plot and forecasted data
-            return html.Div([
-                html.Div([
-                    html.Img(src='data:image/png;base64,{}'.format(image_base64)),
-                ], style={'flex': '2'}),
-                html.Div([
-                    html.H4('Forecasted Income Values:', style={'margin-bottom': '10px', 'font-size': '18px'}),
-                    dcc.Markdown(future_df.to_markdown(index=True))
-                ], style={'flex': '1', 'padding-left': '20px'})
-            ], style={'display': 'flex', 'backgroundColor': '#f5ebe0'})
+            return forecast_panel(fig, 'Forecasted Income Values:', future_df)
         except Exception as e:
+            set_progress('')
             return f"An error occurred while fitting the model or forecasting: {e}"
+        finally:
+            jobs.release(job_key)
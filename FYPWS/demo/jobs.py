@@ -0,0 +1,48 @@
+import os
+import time
+
+import diskcache
+from dash import DiskcacheManager
+
+import config
+
+# Local job queue for background callbacks: a diskcache directory shared by every
+# server process, with each job running in its own child process (no broker needed)
+JOBS_DIR = config.JOBS_DIR
+JOB_TTL = config.JOB_TTL
+
+cache = diskcache.Cache(JOBS_DIR)
+background_manager = DiskcacheManager(cache, expire=JOB_TTL)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Mark a job as running. Returns False if the same job is already running elsewhere.
+# Cancelled jobs are killed without cleaning up, so claims expire after JOB_TTL and a
+# claim whose process has died is taken over.
+def claim(key):
+    key = f"running:{key}"
+    owner = {'pid': os.getpid(), 'started': time.time()}
+    if cache.add(key, owner, expire=JOB_TTL):
+        return True
+    with cache.transact():
+        current = cache.get(key)
+        if current is None or not _alive(current['pid']):
+            cache.set(key, owner, expire=JOB_TTL)
+            return True
+    return False
+
+
+def release(key):
+    key = f"running:{key}"
+    current = cache.get(key)
+    if current is not None and current['pid'] == os.getpid():
+        cache.delete(key)
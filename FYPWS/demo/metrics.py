@@ -0,0 +1,213 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+
+from flask import Response
+
+import config
+import figure_cache
+
+# Instrumentation of the Dash callbacks, exposed in the Prometheus text format on /metrics.
+#
+# instrument(app) wraps app.callback, so it must run before any callback is registered.
+# For every server callback it records:
+#   - the wall time of the whole request (dash_callback_duration_seconds)
+#   - the time spent in the callback function itself, building the figure or component
+#     (dash_callback_build_seconds), and the rest, mostly JSON serialization
+#     (dash_callback_serialize_seconds)
+#   - the size of the JSON response (dash_callback_response_bytes)
+#   - requests and errors, labelled with the figure cache status of the request
+# Callbacks are labelled by their outputs.
+# Background callbacks run their function in a worker process, so only the wall time and
+# response size of their requests (starting and polling the job) are recorded.
+#
+# Requests slower than FYP_SLOW_CALLBACK_MS are logged with their inputs.
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1_000, 10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+logger = logging.getLogger('fypws.slow_callbacks')
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    # Lines of the Prometheus text format, with cumulative bucket counts
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum!r}'
+        yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+class Registry:
+    HISTOGRAMS = {
+        'dash_callback_duration_seconds': ('Wall time of callback requests', TIME_BUCKETS),
+        'dash_callback_build_seconds': ('Time spent in the callback function', TIME_BUCKETS),
+        'dash_callback_serialize_seconds': ('Time spent outside the callback function, mostly serialization', TIME_BUCKETS),
+        'dash_callback_response_bytes': ('Size of the JSON response', BYTES_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (callback, cache status) -> count
+        self.errors = {}  # callback -> count
+        self.histograms = {name: {} for name in self.HISTOGRAMS}
+
+    def observe(self, name, callback, value):
+        with self._lock:
+            histogram = self.histograms[name].get(callback)
+            if histogram is None:
+                histogram = self.histograms[name][callback] = Histogram(self.HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def count_request(self, callback, cache_status):
+        with self._lock:
+            key = (callback, cache_status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def count_error(self, callback):
+        with self._lock:
+            self.errors[callback] = self.errors.get(callback, 0) + 1
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP dash_callback_requests_total Callback requests by figure cache status',
+                '# TYPE dash_callback_requests_total counter',
+            ]
+            for (callback, status), count in sorted(self.requests.items()):
+                lines.append(f'dash_callback_requests_total{{callback="{callback}",cache="{status}"}} {count}')
+            lines += [
+                '# HELP dash_callback_errors_total Callback requests that raised an exception',
+                '# TYPE dash_callback_errors_total counter',
+            ]
+            for callback, count in sorted(self.errors.items()):
+                lines.append(f'dash_callback_errors_total{{callback="{callback}"}} {count}')
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for callback, histogram in sorted(self.histograms[name].items()):
+                    lines.extend(histogram.lines(name, f'callback="{callback}"'))
+            figure_stats = figure_cache.cache.stats()
+            for key, help_text in [('hits', 'Figure cache memory hits'), ('disk_hits', 'Figure cache disk hits'),
+                                   ('misses', 'Figure cache misses')]:
+                lines += [f'# HELP figure_cache_{key}_total {help_text}', f'# TYPE figure_cache_{key}_total counter',
+                          f'figure_cache_{key}_total {figure_stats[key]}']
+            lines += ['# HELP figure_cache_bytes Serialized size of the figures held in memory',
+                      '# TYPE figure_cache_bytes gauge', f"figure_cache_bytes {figure_stats['bytes']}"]
+            return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Time spent in the callback function by the current request
+_current = threading.local()
+
+
+# Figure cache status of one request: 'miss' if any figure was built, 'hit' if every
+# figure came from the cache, 'none' if no cached figure was used
+def cache_status(lookups):
+    if not lookups:
+        return 'none'
+    return 'miss' if 'miss' in lookups else 'hit'
+
+
+# Label of a callback: its outputs as Dash keys them ('graph.figure', '..a.children...b.style..'),
+# escaped for the Prometheus text format
+def label(key):
+    return key.strip('.').replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _short_repr(value, limit=200):
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + '...'
+
+
+# Times the callback function itself
+def _time_build(fn):
+    @functools.wraps(fn)
+    def build(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.build = time.perf_counter() - start
+    return build
+
+
+# Times the whole request handled by Dash's wrapper, which calls the function and
+# serializes its result
+def _time_request(name, dispatch, background):
+    @functools.wraps(dispatch)
+    def request(*args, **kwargs):
+        _current.build = None
+        figure_cache.start_recording()
+        start = time.perf_counter()
+        try:
+            response = dispatch(*args, **kwargs)
+        except Exception as e:
+            # PreventUpdate and friends are how callbacks skip an update, not failures
+            if not type(e).__module__.startswith('dash'):
+                registry.count_error(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            lookups = figure_cache.stop_recording()
+            registry.observe('dash_callback_duration_seconds', name, elapsed)
+            registry.count_request(name, cache_status(lookups))
+            build = _current.build
+            if build is not None and not background:
+                registry.observe('dash_callback_build_seconds', name, build)
+                registry.observe('dash_callback_serialize_seconds', name, max(elapsed - build, 0.0))
+            if config.SLOW_CALLBACK_MS and elapsed * 1000 >= config.SLOW_CALLBACK_MS:
+                logger.warning('slow callback %s: %.1f ms (build %s) inputs=%s', name, elapsed * 1000,
+                               'n/a' if build is None else f'{build * 1000:.1f} ms',
+                               ', '.join(_short_repr(arg) for arg in args))
+        if isinstance(response, str):
+            registry.observe('dash_callback_response_bytes', name, len(response.encode('utf-8')))
+        return response
+    # Tools that call the callback function directly keep working
+    request.__wrapped__ = dispatch.__wrapped__
+    return request
+
+
+def metrics_response():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# Wrap every callback registered on `app` from now on and serve /metrics
+def instrument(app):
+    register = app.callback
+
+    @functools.wraps(register)
+    def callback(*args, **kwargs):
+        # Dash adds the callback's entry when the decorator is made and its function when
+        # the decorator is applied
+        before = set(app.callback_map)
+        decorator = register(*args, **kwargs)
+        background = bool(kwargs.get('background'))
+
+        def wrap(fn):
+            # Background functions are registered with the job manager by their source,
+            # so they are not wrapped
+            result = decorator(fn if background else _time_build(fn))
+            for key in set(app.callback_map) - before:
+                spec = app.callback_map[key]
+                spec['callback'] = _time_request(label(key), spec['callback'], background)
+            return result
+        return wrap
+
+    app.callback = callback
+    app.server.add_url_rule('/metrics', 'metrics', metrics_response)
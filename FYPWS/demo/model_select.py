@@ -0,0 +1,249 @@
+import math
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import config
+
+# Model selection for the GDP forecasts, visiting far fewer models than the 3x3x3 ARIMA
+# grid of arima_search:
+#
+#   1. Baselines, fitted first: a random walk with drift (closed form) and additive
+#      exponential smoothing with a trend, plain and damped (Holt).
+#   2. A stepwise ARIMA search in the style of Hyndman & Khandakar (2008): the order of
+#      differencing d comes from repeated KPSS tests, the search starts from (2,d,2),
+#      (0,d,0), (1,d,0) and (0,d,1) and moves to any neighbour (p or q one up or down,
+#      both together, constant or drift toggled) with a lower criterion, until no
+#      neighbour improves. Every fit is warm-started from the parameters of the model it
+#      neighbours.
+#   The search stops after its starting models, keeping the best baseline, when none of
+#   them beats that baseline by more than BASELINE_MARGIN.
+#
+# The likelihoods of models with different differencing, and of ARIMA and exponential
+# smoothing models, are not comparable, so every candidate is scored with the same
+# criterion: the AICc of its one-step-ahead in-sample errors over the observations after
+# the first MAX_D.
+
+MAX_P = 2
+MAX_Q = 2
+MAX_D = 2
+KPSS_ALPHA = 0.05
+
+BASELINE_MARGIN = config.BASELINE_MARGIN
+
+# ARIMA trend with and without a constant: a mean when d = 0, a drift when d = 1
+TRENDS = {0: ('c', 'n'), 1: ('t', 'n'), 2: ('n',)}
+
+
+def aicc(errors, k):
+    errors = np.asarray(errors, dtype=np.float64)[MAX_D:]
+    m = len(errors)
+    sse = float(errors @ errors)
+    if m - k - 1 <= 0 or sse <= 0 or not math.isfinite(sse):
+        return math.inf
+    return m * math.log(sse / m) + 2 * k + 2 * k * (k + 1) / (m - k - 1)
+
+
+# Order of differencing: difference until a KPSS test no longer rejects stationarity
+def ndiffs(values, alpha=KPSS_ALPHA, max_d=MAX_D):
+    from statsmodels.tsa.stattools import kpss
+
+    d = 0
+    with warnings.catch_warnings():
+        # KPSS warns when the statistic is outside its table of p-values
+        warnings.simplefilter('ignore')
+        while d < max_d and kpss(values, nlags='auto')[1] < alpha:
+            values = np.diff(values)
+            d += 1
+    return d
+
+
+class Candidate:
+    def __init__(self, label, ic, k, forecast, params=None, order=None, trend=None):
+        self.label = label
+        self.ic = ic
+        self.k = k
+        self.forecast = forecast  # steps, level -> (mean, lower, upper)
+        self.params = params      # parameter name -> value, for warm starts
+        self.order = order
+        self.trend = trend
+
+
+def arima_label(order, trend):
+    suffix = {'c': ' with mean', 't': ' with drift'}.get(trend, '')
+    return f"ARIMA({order[0]},{order[1]},{order[2]}){suffix}"
+
+
+def drift(values):
+    n = len(values)
+    steps_taken = np.diff(values)
+    c = steps_taken.mean()
+    errors = np.r_[0.0, steps_taken - c]
+    sigma = math.sqrt(float(errors[1:] @ errors[1:]) / max(n - 2, 1))
+
+    def forecast(steps, level):
+        from scipy import stats
+
+        h = np.arange(1, steps + 1)
+        mean = values[-1] + h * c
+        spread = stats.norm.ppf(0.5 + level / 2) * sigma * np.sqrt(h * (1 + h / (n - 1)))
+        return mean, mean - spread, mean + spread
+
+    return Candidate('Drift', aicc(errors, 2), 2, forecast, params={'x1': c, 'sigma2': sigma ** 2},
+                     order=(0, 1, 0), trend='t')
+
+
+def ets(values, damped):
+    from statsmodels.tsa.exponential_smoothing.ets import ETSModel
+
+    series = pd.Series(values)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = ETSModel(series, trend='add', damped_trend=damped).fit(disp=False)
+    k = len(results.params) + 1
+
+    def forecast(steps, level):
+        frame = results.get_prediction(start=len(values), end=len(values) + steps - 1).summary_frame(alpha=1 - level)
+        return frame['mean'].to_numpy(), frame['pi_lower'].to_numpy(), frame['pi_upper'].to_numpy()
+
+    return Candidate('ETS(A,Ad,N)' if damped else 'ETS(A,A,N)', aicc(results.resid, k), k, forecast)
+
+
+# Start values for an ARIMA model from a neighbouring fit, matched by parameter name.
+# None when the neighbour's AR or MA part is not stationary or invertible once cut to
+# the new order, so the model starts from its own estimates.
+def warm_start(model, params):
+    from statsmodels.tsa.statespace.tools import is_invertible
+
+    if not params:
+        return None
+    start = np.array([params.get(name, 0.0) for name in model.param_names])
+    ar = [params.get(name, 0.0) for name in model.param_names if name.startswith('ar.')]
+    ma = [params.get(name, 0.0) for name in model.param_names if name.startswith('ma.')]
+    if (ar and not is_invertible(np.r_[1, -np.asarray(ar)])) or (ma and not is_invertible(np.r_[1, ma])):
+        return None
+    if params.get('sigma2', 0.0) <= 0:
+        return None
+    return start
+
+
+def arima(values, order, trend, params=None):
+    import statsmodels.api as sm
+
+    model = sm.tsa.ARIMA(values, order=order, trend=trend)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results = model.fit(start_params=warm_start(model, params))
+    k = len(results.params)
+
+    def forecast(steps, level):
+        prediction = results.get_forecast(steps=steps)
+        conf_int = np.asarray(prediction.conf_int(alpha=1 - level))
+        return np.asarray(prediction.predicted_mean), conf_int[:, 0], conf_int[:, 1]
+
+    return Candidate(arima_label(order, trend), aicc(results.resid, k), k, forecast,
+                     params=dict(zip(results.param_names, results.params)), order=order, trend=trend)
+
+
+# Orders and trends next to a model, in the order Hyndman & Khandakar try them
+def neighbours(order, trend):
+    p, d, q = order
+    moves = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1)]
+    for dp, dq in moves:
+        if 0 <= p + dp <= MAX_P and 0 <= q + dq <= MAX_Q:
+            yield (p + dp, d, q + dq), trend
+    for other in TRENDS[d]:
+        if other != trend:
+            yield order, other
+
+
+class Selection:
+    def __init__(self, best, table, failed, fits, elapsed, d):
+        self.best = best
+        self.table = table        # [(label, criterion)] of every candidate, best first
+        self.failed = failed      # [(label, reason)]
+        self.fits = fits          # models fitted, the closed form drift included
+        self.elapsed = elapsed
+        self.d = d
+
+    @property
+    def order(self):
+        return self.best.order
+
+    def forecast(self, steps, level=0.95):
+        return self.best.forecast(steps, level)
+
+
+# Pick a model for `series`: baselines first, then the stepwise ARIMA search unless a
+# baseline is competitive with its starting models. `progress(fits)` is called after
+# every fit.
+def select_model(series, margin=BASELINE_MARGIN, progress=None):
+    values = np.asarray(series, dtype=np.float64).ravel()
+    start = time.perf_counter()
+    candidates = {}
+    failed = []
+
+    def attempt(label, fit):
+        try:
+            candidate = fit()
+        except Exception as e:
+            failed.append((label, f"{type(e).__name__}: {e}"))
+            return None
+        if not math.isfinite(candidate.ic):
+            failed.append((label, 'non-finite criterion'))
+            return None
+        candidates[candidate.label] = candidate
+        if progress is not None:
+            progress(len(candidates) + len(failed))
+        return candidate
+
+    baselines = [attempt('Drift', lambda: drift(values))]
+    for damped in (False, True):
+        baselines.append(attempt('ETS', lambda: ets(values, damped)))
+    baselines = [b for b in baselines if b is not None]
+    best_baseline = min(baselines, key=lambda c: c.ic, default=None)
+
+    d = ndiffs(values)
+    visited = set()
+
+    # The random walk with drift is ARIMA(0,1,0) with drift, already fitted in closed form
+    def fit_arima(order, trend, params=None):
+        visited.add((order, trend))
+        if order == (0, 1, 0) and trend == 't' and 'Drift' in candidates:
+            return candidates['Drift']
+        return attempt(arima_label(order, trend), lambda: arima(values, order, trend, params))
+
+    trend = TRENDS[d][0]
+    starts = [((2, d, 2), trend), ((0, d, 0), trend), ((1, d, 0), trend), ((0, d, 1), trend)]
+    best = None
+    params = None
+    for order, trend in starts:
+        candidate = fit_arima(order, trend, params)
+        if candidate is not None:
+            params = candidate.params
+            if best is None or candidate.ic < best.ic:
+                best = candidate
+
+    if best is not None and (best_baseline is None or best.ic < best_baseline.ic - margin):
+        improved = True
+        while improved:
+            improved = False
+            for order, trend in neighbours(best.order, best.trend):
+                if (order, trend) in visited:
+                    continue
+                candidate = fit_arima(order, trend, best.params)
+                if candidate is not None and candidate.ic < best.ic:
+                    best = candidate
+                    improved = True
+                    break
+    if best is None or (best_baseline is not None and best.ic >= best_baseline.ic - margin):
+        best = best_baseline
+    if best is None:
+        reasons = '; '.join(f"{label}: {reason}" for label, reason in failed)
+        raise ValueError(f"no model could be fitted ({reasons})")
+
+    table = sorted(((c.label, c.ic) for c in candidates.values()), key=lambda x: x[1])
+    fits = len(candidates) + len(failed)
+    return Selection(best, table, failed, fits, time.perf_counter() - start, d)
@@ -1,11 +1,31 @@
-from dash import dcc, html
+from dash import dcc, html, ClientsideFunction
+from flask import Response
 import plotly.express as px
-import pandas as pd
-from dash.dependencies import Input, Output
+import data
+import prerender
+from dash.dependencies import Input, Output, State
+from figure_cache import cached_figure
+from figures import with_projection, register_projection_toggle, slim_figure, encode_array
+from region_index import RegionIndex
 from sidebar import sidebar
 
-# Load the data
-MPImap = pd.read_csv("MPImap.csv")
+# Rows and region options of every country and sub-national region, built on first use
+@data.derived('mpi')
+def region_index(MPImap):
+    return RegionIndex(MPImap)
+
+REGIONS_URL = '/mpi-map/regions.json'
+# What the browser needs to fetch the region options; the URL gets the app's path prefix
+# when the callbacks are registered
+regions_settings = {'url': REGIONS_URL}
+
+DEFAULT_PROJECTION = 'natural earth'
+
+# Map type -> (column driving marker size and color, title)
+MAP_TYPES = {
+    'urban': ('Intensity of Deprivation Urban', 'Intensity of Deprivation Urban by Country and Region'),
+    'rural': ('Intensity of Deprivation Rural', 'Intensity of Deprivation Rural by Country and Region'),
+}
 
 def mpi_map_layout():
     return html.Div([
@@ -29,7 +49,7 @@ def mpi_map_layout():
                     html.Label("Select Country:"),
                     dcc.Dropdown(
                         id='country-dropdown',
-                        options=[{'label': country, 'value': country} for country in MPImap['Country'].unique()],
+                        options=[{'label': country, 'value': country} for country in data.get('mpi')['Country'].unique()],
                         value=None,
                         placeholder='Select a country',
                         style={'margin-bottom': '0px', 'width': '200px'}
@@ -60,87 +80,132 @@ def mpi_map_layout():
             ], style={'display': 'flex', 'margin-bottom': '20px'}),
             dcc.Graph(
                 id='mpi-intensity-map',
+                figure=prerender.figure('mpi-map'),
                 style={'width': '80%', 'height': '800px', 'margin-right': '20px', 'margin-left': '0px'}
             ),
+            dcc.Store(id='mpi-regions-settings', data=regions_settings),
         ], style={'marginLeft': '-170px', 'width': 'calc(100% - 250px)', 'padding-left': '0px'})
     ], style={'display': 'flex'})
 
+def scatter_map(filtered_df, map_type):
+    size_col, title_text = MAP_TYPES[map_type]
+    return px.scatter_geo(
+        filtered_df,
+        lat='Latitude',
+        lon='Longitude',
+        hover_name='Hover Name',
+        hover_data={
+            'Country': True,
+            'Sub-national region': True
+        },
+        size=size_col,
+        color=size_col,
+        color_continuous_scale='Viridis',
+        projection=DEFAULT_PROJECTION,
+        title=title_text
+    )
+
+# Figures are cached per country and region. The marker sizes, colors and titles of
+# every map type travel in layout.meta, so the map type and projection are switched in
+# the browser (assets/map_toggles.js) or applied to the cached figure by with_map_type.
+@cached_figure('mpi_map', datasets=('mpi',))
+def build_mpi_map(selected_country, selected_subnational):
+    filtered_df = region_index().rows(selected_country, selected_subnational)
+
+    map_types = {}
+    for map_type, (size_col, title_text) in MAP_TYPES.items():
+        trace = scatter_map(filtered_df, map_type).data[0]
+        map_types[map_type] = {
+            'title': title_text,
+            'hovertemplate': trace.hovertemplate,
+            'size': encode_array(trace.marker.size),
+            'color': encode_array(trace.marker.color),
+            'sizeref': trace.marker.sizeref,
+        }
+
+    fig = scatter_map(filtered_df, 'urban')
+    fig.update_layout(
+        title={
+            'text': MAP_TYPES['urban'][1],
+            'y': 0.9,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        },
+        geo=dict(
+            showframe=True,
+            showcoastlines=True,
+            coastlinecolor='black',
+            projection_type=DEFAULT_PROJECTION,
+            bgcolor='#f5ebe0'
+        ),
+        coloraxis_colorbar=dict(
+            title='Intensity',
+            tickprefix='',
+            titlefont=dict(size=14),
+            tickfont=dict(size=12)
+        ),
+        paper_bgcolor='#f5ebe0',
+        plot_bgcolor='#f5ebe0',
+        height=800,
+        width=1600,
+        meta={'map_types': map_types}
+    )
+    return slim_figure(fig.to_dict())
+
+# Copy of a cached figure showing another map type, the same change the browser makes
+def with_map_type(fig, map_type):
+    variant = fig['layout']['meta']['map_types'][map_type]
+    trace = dict(fig['data'][0], hovertemplate=variant['hovertemplate'])
+    trace['marker'] = dict(trace['marker'], size=variant['size'], color=variant['color'], sizeref=variant['sizeref'])
+    layout = dict(fig['layout'], title=dict(fig['layout']['title'], text=variant['title']))
+    return dict(fig, data=[trace] + fig['data'][1:], layout=layout)
+
+# Region options of every country, serialized once
+def regions_response():
+    response = Response(region_index().options_json, mimetype='application/json')
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+def mpi_figure(selected_country, selected_subnational, map_type, selected_projection):
+    figure = build_mpi_map(selected_country, selected_subnational)
+    return with_projection(with_map_type(figure, map_type or 'urban'), selected_projection)
+
+# What the callback returns for the page's initial values, shipped in the layout
+def default_figure():
+    return mpi_figure(None, None, 'urban', DEFAULT_PROJECTION)
+
 def register_callbacks(app):
-    @app.callback(
+    app.server.add_url_rule(REGIONS_URL, 'mpi_map_regions', regions_response)
+    regions_settings['url'] = app.get_relative_path(REGIONS_URL)
+
+    # The browser loads every country's region options once (assets/mpi_regions.js)
+    # and fills the dropdown without a server round trip
+    app.clientside_callback(
+        ClientsideFunction(namespace='mpi_map', function_name='region_options'),
         Output('subnational-dropdown', 'options'),
-        [Input('country-dropdown', 'value')]
+        [Input('country-dropdown', 'value')],
+        [State('mpi-regions-settings', 'data')]
     )
-    def update_subnational_options(selected_country):
-        if selected_country:
-            filtered_df = MPImap[MPImap['Country'] == selected_country]
-            options = [{'label': region, 'value': region} for region in filtered_df['Sub-national region'].unique()]
-        else:
-            options = []
-        return options
 
+    # Only a new country or region goes to the server. The layout already holds the
+    # default figure, so there is no initial call.
     @app.callback(
         Output('mpi-intensity-map', 'figure'),
         [Input('country-dropdown', 'value'),
-         Input('subnational-dropdown', 'value'),
-         Input('map-type-dropdown', 'value'),
-         Input('projection-dropdown', 'value')]
+         Input('subnational-dropdown', 'value')],
+        [State('map-type-dropdown', 'value'),
+         State('projection-dropdown', 'value')],
+        prevent_initial_call=True
     )
     def update_map(selected_country, selected_subnational, map_type, selected_projection):
-        filtered_df = MPImap
-        if selected_country:
-            filtered_df = filtered_df[filtered_df['Country'] == selected_country]
-        if selected_subnational:
-            filtered_df = filtered_df[filtered_df['Sub-national region'] == selected_subnational]
-
-        if map_type == 'urban':
-            size_col = 'Intensity of Deprivation Urban'
-            color_col = 'Intensity of Deprivation Urban'
-            title_text = 'Intensity of Deprivation Urban by Country and Region'
-        elif map_type == 'rural':
-            size_col = 'Intensity of Deprivation Rural'
-            color_col = 'Intensity of Deprivation Rural'
-            title_text = 'Intensity of Deprivation Rural by Country and Region'
-
-        fig = px.scatter_geo(
-            filtered_df,
-            lat='Latitude',
-            lon='Longitude',
-            hover_name='Hover Name',
-            hover_data={
-                'Country': True,
-                'Sub-national region': True
-            },
-            size=size_col,
-            color=color_col,
-            color_continuous_scale='Viridis',
-            projection=selected_projection,
-            title=title_text
-        )
-
-        fig.update_layout(
-            title={
-                'text': title_text,
-                'y': 0.9,
-                'x': 0.5,
-                'xanchor': 'center',
-                'yanchor': 'top'
-            },
-            geo=dict(
-                showframe=True,
-                showcoastlines=True,
-                coastlinecolor='black',
-                projection_type=selected_projection,
-                bgcolor='#f5ebe0'
-            ),
-            coloraxis_colorbar=dict(
-                title='Intensity',
-                tickprefix='',
-                titlefont=dict(size=14),
-                tickfont=dict(size=12)
-            ),
-            paper_bgcolor='#f5ebe0',
-            plot_bgcolor='#f5ebe0',
-            height=800,
-            width=1600
-        )
-        return fig
+        return mpi_figure(selected_country, selected_subnational, map_type, selected_projection)
+
+    register_projection_toggle(app, 'mpi-intensity-map', 'projection-dropdown')
+    app.clientside_callback(
+        ClientsideFunction(namespace='maps', function_name='set_map_type'),
+        Output('mpi-intensity-map', 'figure', allow_duplicate=True),
+        Input('map-type-dropdown', 'value'),
+        State('mpi-intensity-map', 'figure'),
+        prevent_initial_call=True
+    )
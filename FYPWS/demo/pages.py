@@ -0,0 +1,60 @@
+import importlib
+import threading
+
+import config
+
+# Pages of the app: path -> (module, layout function, callback registration function).
+#
+# Dash sends the whole callback graph to the browser when the app loads, so every page's
+# callbacks are registered at startup. That only imports the page modules, which define
+# functions and nothing else: a page's datasets, derived tables, default figures and
+# modelling libraries are loaded the first time the page is requested, or at startup for
+# the pages listed in FYP_PRELOAD_PAGES.
+PAGES = {
+    '/': ('home', 'home_layout', None),
+    '/salary-map': ('salary_map', 'salary_map_layout', 'register_callbacks'),
+    '/mpi-map': ('mpi_map', 'mpi_map_layout', 'register_callbacks'),
+    '/income-map': ('income_map', 'income_map_layout', 'register_callbacks'),
+    '/gdp-map': ('GDP_map', 'gdp_map_layout', 'register_callbacks'),
+    '/forecasting': ('forecast', 'forecasting_layout', 'register_forecasting_callbacks'),
+    '/incForecasting': ('incomeforecast', 'incForecasting_layout', 'inc_register_forecasting_callbacks'),
+}
+
+_ready = set()
+# One lock per page, so a slow first build only holds up requests for the same page
+_locks = {path: threading.Lock() for path in PAGES}
+
+
+def register_callbacks(app):
+    for module_name, _, register in PAGES.values():
+        if register:
+            getattr(importlib.import_module(module_name), register)(app)
+
+
+# Layout of the page at `path`, the home page for unknown paths
+def layout(path):
+    if path not in PAGES:
+        path = '/'
+    module_name, layout_name, _ = PAGES[path]
+    build = getattr(importlib.import_module(module_name), layout_name)
+    if path in _ready:
+        return build()
+    # The first request initializes the page, requests for it arriving meanwhile wait
+    with _locks[path]:
+        if path not in _ready:
+            page = build()
+            _ready.add(path)
+            return page
+    return build()
+
+
+# Build the layouts of the given pages once, so their data is ready before the first request
+def preload(paths=None):
+    if paths is None:
+        paths = config.PRELOAD_PAGES
+    if 'all' in paths:
+        paths = list(PAGES)
+    for path in paths:
+        if path not in PAGES:
+            raise ValueError(f"Unknown page: {path}")
+        layout(path)
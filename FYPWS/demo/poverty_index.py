@@ -0,0 +1,162 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import config
+import data
+from rankings import RankingIndex
+
+# Poverty Index of complete_data.csv: every indicator is min-max normalized over all
+# countries, inverted where a higher value means less poverty, weighted and summed.
+#
+# The engine keeps the raw values, the running min and max of each indicator and the
+# normalized columns. Changing one country's value only recomputes that row, unless the
+# change moves the indicator's min or max, in which case that indicator's column is
+# renormalized for every row.
+
+INDICATORS = ['Median Salary', 'Inequality in Income', 'GDP per capita',
+              'Intensity of Deprivation Urban', 'Intensity of Deprivation Rural']
+
+# Higher salary and GDP mean less poverty
+INVERTED = ['Median Salary', 'GDP per capita']
+
+
+class PovertyIndex:
+    def __init__(self, df, weights=None, inverted=INVERTED, label='Country'):
+        self.label = label
+        self.weights = {indicator: 1.0 for indicator in INDICATORS}
+        self.weights.update(weights or {})
+        unknown = set(self.weights) - set(INDICATORS)
+        if unknown:
+            raise ValueError(f"Unknown indicators: {', '.join(sorted(unknown))}")
+        self.inverted = set(inverted)
+
+        self.labels = df[label].astype(str).tolist()
+        self.positions = {name: i for i, name in enumerate(self.labels)}
+        self.raw = {indicator: df[indicator].to_numpy(dtype=np.float64, copy=True) for indicator in INDICATORS}
+        self.low = {indicator: values.min() for indicator, values in self.raw.items()}
+        self.high = {indicator: values.max() for indicator, values in self.raw.items()}
+        self.normalized = {indicator: self._normalize(indicator, self.raw[indicator]) for indicator in INDICATORS}
+        self.index = self._combine(slice(None))
+
+        # Bumped on every change so readers know when to rebuild anything derived
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _normalize(self, indicator, values):
+        span = self.high[indicator] - self.low[indicator]
+        if span == 0:
+            normalized = np.zeros_like(values)
+        else:
+            normalized = (values - self.low[indicator]) / span
+        if indicator in self.inverted:
+            normalized = 1 - normalized
+        return normalized
+
+    # Weighted sum of the normalized indicators for the given rows
+    def _combine(self, rows):
+        total = np.zeros(len(self.labels))[rows]
+        for indicator in INDICATORS:
+            total = total + self.weights[indicator] * self.normalized[indicator][rows]
+        return total
+
+    def _append(self, country):
+        self.positions[country] = len(self.labels)
+        self.labels.append(country)
+        for indicator in INDICATORS:
+            self.raw[indicator] = np.append(self.raw[indicator], 0.0)
+            self.normalized[indicator] = np.append(self.normalized[indicator], 0.0)
+        self.index = np.append(self.index, 0.0)
+        return self.positions[country]
+
+    # Apply {country: {indicator: value}}. Countries not seen before are added with every
+    # other indicator at 0, like the missing values in complete_data.csv.
+    # Returns the number of rows whose index was recomputed.
+    def update(self, changes):
+        with self._lock:
+            changed_rows = set()
+            renormalize = set()
+            for country, values in changes.items():
+                row = self.positions.get(country)
+                if row is None:
+                    row = self._append(country)
+                    # The new row's 0s may lie outside the current ranges
+                    for indicator in INDICATORS:
+                        self.low[indicator] = min(self.low[indicator], 0.0)
+                        self.high[indicator] = max(self.high[indicator], 0.0)
+                    renormalize.update(INDICATORS)
+                for indicator, value in values.items():
+                    if indicator not in self.raw:
+                        raise ValueError(f"Unknown indicator: {indicator}")
+                    old = self.raw[indicator][row]
+                    value = float(value)
+                    self.raw[indicator][row] = value
+                    changed_rows.add(row)
+                    previous = (self.low[indicator], self.high[indicator])
+                    if old in previous and value != old:
+                        # The old value was the min or max, so the other end may move
+                        # too (e.g. the old max drops below the min): rescan the column
+                        self.low[indicator] = self.raw[indicator].min()
+                        self.high[indicator] = self.raw[indicator].max()
+                    elif value < previous[0] or value > previous[1]:
+                        # The range grows
+                        self.low[indicator] = min(previous[0], value)
+                        self.high[indicator] = max(previous[1], value)
+                    if (self.low[indicator], self.high[indicator]) != previous:
+                        renormalize.add(indicator)
+
+            for indicator in renormalize:
+                self.normalized[indicator] = self._normalize(indicator, self.raw[indicator])
+            if renormalize:
+                self.index = self._combine(slice(None))
+                recomputed = len(self.labels)
+            else:
+                rows = np.fromiter(sorted(changed_rows), dtype=np.intp)
+                for indicator in INDICATORS:
+                    self.normalized[indicator][rows] = self._normalize(indicator, self.raw[indicator][rows])
+                self.index[rows] = self._combine(rows)
+                recomputed = len(rows)
+            if changed_rows:
+                self.version += 1
+            return recomputed
+
+    # Same columns as complete_data.csv
+    def frame(self):
+        with self._lock:
+            columns = {self.label: self.labels}
+            columns.update({indicator: self.raw[indicator].copy() for indicator in INDICATORS})
+            columns.update({f'Normalized {indicator}': self.normalized[indicator].copy() for indicator in INDICATORS})
+            columns['Poverty Index'] = self.index.copy()
+            return pd.DataFrame(columns)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+# Engine shared by the pages, built from complete_data once per process
+def get():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = PovertyIndex(data.get('complete'), weights=config.POVERTY_WEIGHTS)
+    return _engine
+
+
+_rankings = {}
+
+
+# RankingIndex over the engine's current values, rebuilt only after an update
+def rankings(filter_columns):
+    engine = get()
+    key = tuple(filter_columns)
+    version = engine.version
+    cached = _rankings.get(key)
+    if cached is None or cached[0] != version:
+        cached = _rankings[key] = (version, RankingIndex(engine.frame(), filter_columns))
+    return cached[1]
@@ -0,0 +1,107 @@
+import importlib
+import json
+import os
+import sys
+import threading
+
+from plotly.utils import PlotlyJSONEncoder
+
+import config
+import data
+
+# Default view of each page (no country selected, the default projection and metric),
+# serialized by the build step `python prerender.py [view ...]`. The page layouts ship
+# it in their graph and the graph's callback skips its initial call, so a first visit
+# paints without waiting for a figure to be built.
+#
+# A file is used only while its key is unchanged: the versions of the datasets it was
+# built from, the figure encoding settings and whatever else the view's figure depends on
+# (the home rankings: the Poverty Index weights and runtime updates, and the number of
+# countries). Otherwise, or when the build step has not run, the page module builds it
+# once per key.
+
+# View name -> (page module, function building the figure, datasets it is built from,
+#               function of the module returning the view's other settings, or None)
+VIEWS = {
+    'home': ('home', 'default_figure', ('complete',), 'figure_settings'),
+    'salary-map': ('salary_map', 'default_figure', ('salary',), None),
+    'mpi-map': ('mpi_map', 'default_figure', ('mpi',), None),
+    'income-map': ('income_map', 'default_figure', ('income',), None),
+    # The streaming GDP map shows one year, the animated one every year
+    'gdp-map': ('GDP_map', 'default_figure', ('gdp',), None),
+    'gdp-map-animated': ('GDP_map', 'default_animated_figure', ('gdp',), None),
+}
+
+_figures = {}  # view name -> (key, figure)
+# One lock per view, so building one view does not hold up the others
+_locks = {name: threading.Lock() for name in VIEWS}
+
+
+def path(name):
+    return os.path.join(config.PRERENDER_DIR, f'{name}.json')
+
+
+# Everything the figure of a view depends on, as stored in its file (JSON types only)
+def key(name):
+    module_name, _, datasets, settings = VIEWS[name]
+    return {
+        'versions': {dataset: data.version(dataset) for dataset in datasets},
+        'encoding': {'slim': config.FIGURE_SLIM, 'precision': config.FIGURE_PRECISION,
+                     'typed_arrays': config.FIGURE_TYPED_ARRAYS},
+        'settings': getattr(importlib.import_module(module_name), settings)() if settings else None,
+    }
+
+
+def build_figure(name):
+    module_name, function_name, _, _ = VIEWS[name]
+    return getattr(importlib.import_module(module_name), function_name)()
+
+
+# Figure in the file of a view, None if missing or built with another key
+def load(name, current):
+    try:
+        with open(path(name), encoding='utf-8') as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get('key') != current:
+        return None
+    return stored['figure']
+
+
+# Default figure of a view, read or built once per key
+def figure(name):
+    current = key(name)
+    cached = _figures.get(name)
+    if cached is None or cached[0] != current:
+        with _locks[name]:
+            cached = _figures.get(name)
+            if cached is None or cached[0] != current:
+                fig = load(name, current)
+                if fig is None:
+                    fig = build_figure(name)
+                cached = _figures[name] = (current, fig)
+    return cached[1]
+
+
+# Build step: serialize the default figure of the given views (all by default)
+def build(names=None):
+    os.makedirs(config.PRERENDER_DIR, exist_ok=True)
+    written = {}
+    for name in names or VIEWS:
+        body = json.dumps({'key': key(name), 'figure': build_figure(name)}, cls=PlotlyJSONEncoder)
+        tmp_path = path(name) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(body)
+        os.replace(tmp_path, path(name))
+        written[name] = len(body)
+    return written
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:]
+    unknown = set(names) - set(VIEWS)
+    if unknown:
+        sys.exit(f"unknown views: {', '.join(sorted(unknown))} (any of {', '.join(VIEWS)})")
+    for name, size in build(names).items():
+        print(f"{name}: wrote {path(name)} ({size:,} bytes)")
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+
+# Sorted order of every metric, computed once over the rows where all `filter_columns`
+# are non-zero. Top-N and bottom-N lookups are then slices of these arrays.
+class RankingIndex:
+    def __init__(self, df, filter_columns, label='Country'):
+        mask = np.ones(len(df), dtype=bool)
+        for column in filter_columns:
+            mask &= df[column].to_numpy() > 0
+        rows = df[mask]
+        self.label = label
+        self.labels = rows[label].astype(str).to_numpy()
+        self.values = {}
+        self.order = {}
+        for column in rows.select_dtypes('number').columns:
+            values = rows[column].to_numpy()
+            self.values[column] = values
+            # Descending order, stable so ties keep the order of the data
+            self.order[column] = np.argsort(-values, kind='stable').astype(np.int32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _frame(self, metric, positions):
+        return pd.DataFrame({
+            self.label: self.labels[positions],
+            metric: self.values[metric][positions],
+        })
+
+    # The n rows with the highest values of `metric`, highest first
+    def top(self, metric, n=10):
+        return self._frame(metric, self.order[metric][:n])
+
+    # The n rows with the lowest values of `metric`, lowest first
+    def bottom(self, metric, n=10):
+        return self._frame(metric, self.order[metric][::-1][:n])
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+
+# Runs of equal keys in `keys[order]`: yields (position in order of the run's first row, start, stop)
+def _runs(keys, order):
+    if len(order) == 0:
+        return
+    sorted_keys = keys[order]
+    bounds = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+        yield order[start], start, stop
+
+
+# Row positions of every country, every (country, region) pair and every region, built
+# once from the categorical codes of the two columns. Lookups return the matching rows in
+# their original order without scanning the frame.
+class RegionIndex:
+    def __init__(self, df, country='Country', region='Sub-national region'):
+        self.df = df
+        countries = pd.Categorical(df[country])
+        regions = pd.Categorical(df[region])
+        country_codes = countries.codes.astype(np.int64)
+        region_codes = regions.codes.astype(np.int64)
+        # One key per (country, region) pair
+        pair_codes = country_codes * (len(regions.categories) + 1) + region_codes
+
+        self.countries = {}
+        self.pairs = {}
+        self.regions = {}
+        # Stable sorts, so the rows of each run keep the order of the frame
+        order = np.argsort(country_codes, kind='stable')
+        for first, start, stop in _runs(country_codes, order):
+            if country_codes[first] >= 0:
+                self.countries[countries[first]] = order[start:stop]
+        order = np.argsort(pair_codes, kind='stable')
+        for first, start, stop in _runs(pair_codes, order):
+            if country_codes[first] >= 0 and region_codes[first] >= 0:
+                self.pairs[(countries[first], regions[first])] = order[start:stop]
+        order = np.argsort(region_codes, kind='stable')
+        for first, start, stop in _runs(region_codes, order):
+            if region_codes[first] >= 0:
+                self.regions[regions[first]] = order[start:stop]
+
+        # Region dropdown options of each country, in order of first appearance, and the
+        # same as JSON for the browser
+        region_values = df[region].to_numpy()
+        self.options = {
+            name: [{'label': value, 'value': value} for value in pd.unique(region_values[positions])]
+            for name, positions in self.countries.items()
+        }
+        self.options_json = json.dumps(self.options, separators=(',', ':'))
+
+    # Positions of the rows matching a country and/or a region (None for any)
+    def positions(self, country=None, region=None):
+        empty = np.empty(0, dtype=np.intp)
+        if country and region:
+            return self.pairs.get((country, region), empty)
+        if country:
+            return self.countries.get(country, empty)
+        if region:
+            return self.regions.get(region, empty)
+        return None
+
+    def rows(self, country=None, region=None):
+        positions = self.positions(country, region)
+        if positions is None:
+            return self.df
+        return self.df.iloc[positions]
+
+    def region_options(self, country):
+        return self.options.get(country, []) if country else []
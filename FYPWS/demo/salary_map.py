@@ -1,14 +1,16 @@
 from dash import dcc, html
 import plotly.express as px
-import pandas as pd
-from dash.dependencies import Input, Output
+import data
+import prerender
+from dash.dependencies import Input, Output, State
+from figure_cache import cached_figure
+from figures import with_projection, register_projection_toggle
 from sidebar import sidebar
 
-# Load the data
-salaryMap = pd.read_csv("C:/Users/William/Documents/FYPWS/demo/salaryMap.csv")
-
-# Filter data for dropdown options (assuming countries are in 'Country' column)
-country_options = [{'label': country, 'value': country} for country in salaryMap['Country'].unique()]
+# Dropdown options (assuming countries are in 'Country' column), built on first use
+@data.derived('salary')
+def country_options(salaryMap):
+    return [{'label': country, 'value': country} for country in salaryMap['Country'].unique()]
 
 # Projection options for the dropdown menu
 projection_options = [
@@ -23,7 +25,7 @@ def salary_map_layout():
             html.H2("Salary by Country World Map"),
             dcc.Dropdown(
                 id='country-search-dropdown-salary',
-                options=country_options,
+                options=country_options(),
                 placeholder='Select a country',
                 style={'width': '35%'}  
             ),
@@ -36,101 +38,120 @@ def salary_map_layout():
             ),
             dcc.Graph(
                 id='salary-map',
+                figure=prerender.figure('salary-map'),
                 style={'width': '80%', 'height': '800px'} 
             )
         ], style={'marginLeft': '-170px', 'width': 'calc(100% - 250px)'})  
     ], style={'display': 'flex'})
 
+DEFAULT_PROJECTION = 'natural earth'
+
+# Figures are cached per country so popular views are not rebuilt, the projection is
+# applied per request
+@cached_figure('salary_map', datasets=('salary',))
+def build_salary_map(selected_country):
+    salaryMap = data.get('salary')
+    if selected_country:
+        filtered_df = salaryMap[salaryMap['Country'] == selected_country]
+    else:
+        filtered_df = salaryMap
+
+    figSalaryDash = px.choropleth(
+        filtered_df,
+        locations='Country',
+        locationmode='country names',
+        color='Median Salary',
+        hover_name='Country',
+        hover_data={
+            'Median Salary': True,
+            'Average Salary': True,
+            'Lowest Salary': True,
+            'Highest Salary': True
+        },
+        color_continuous_scale=px.colors.sequential.Plasma,
+        projection=DEFAULT_PROJECTION,  # The callback applies the selected projection
+        title='Median Salary by Country'
+    )
+    
+    figSalaryDash.update_layout(
+        title={
+            'text': 'Salary by Country',
+            'y': 0.9,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        },
+        geo=dict(
+            showframe=True,
+            showcoastlines=True,
+            coastlinecolor='black',
+            projection_type=DEFAULT_PROJECTION,
+            bgcolor='#f5ebe0'
+        ),
+        coloraxis_colorbar=dict(
+            title='Salary',
+            tickprefix='$',
+            titlefont=dict(size=14),
+            tickfont=dict(size=12)
+        ),
+        paper_bgcolor='#f5ebe0',
+        plot_bgcolor='#f5ebe0',
+        height=800,
+        width=1600
+    )
+    
+    # Add annotations only when a country is selected
+    if selected_country:
+        if not filtered_df.empty:
+            country_info = filtered_df.iloc[0]
+            annotation_text = (
+                f"<b>Country:</b> {country_info['Country']}<br>"
+                f"<b>Median Salary:</b> ${country_info['Median Salary']:,.2f}<br>"
+                f"<b>Average Salary:</b> ${country_info['Average Salary']:,.2f}<br>"
+                f"<b>Lowest Salary:</b> ${country_info['Lowest Salary']:,.2f}<br>"
+                f"<b>Highest Salary:</b> ${country_info['Highest Salary']:,.2f}"
+            )
+            figSalaryDash.add_annotation(
+                x=0.05,
+                y=0.05,
+                text=annotation_text,
+                showarrow=True,
+                arrowhead=1,
+                xref='paper',
+                yref='paper',
+                align='center',
+                font=dict(size=16, color="black"),
+                borderwidth=1
+            )
+        else:
+            figSalaryDash.add_annotation(
+                x=0.1,
+                y=0.1,
+                text="No country found matching your search.",
+                showarrow=False,
+                xref='paper',
+                yref='paper',
+                align='center',
+                font=dict(size=16, color="black"),
+                borderwidth=1
+            )
+
+    return figSalaryDash.to_dict()
+
+# What the callback returns for the page's initial values, shipped in the layout
+def default_figure():
+    return with_projection(build_salary_map(None), DEFAULT_PROJECTION)
+
 def register_callbacks(app):
+    # A projection change is made in the browser, only a new country goes to the server.
+    # The layout already holds the default figure, so there is no initial call.
     @app.callback(
         Output('salary-map', 'figure'),
-        [Input('country-search-dropdown-salary', 'value'),
-         Input('projection-dropdown-salary', 'value')]
+        [Input('country-search-dropdown-salary', 'value')],
+        [State('projection-dropdown-salary', 'value')],
+        prevent_initial_call=True
     )
     def update_map(selected_country, selected_projection):
-        if selected_country:
-            filtered_df = salaryMap[salaryMap['Country'] == selected_country]
-        else:
-            filtered_df = salaryMap
-
-        figSalaryDash = px.choropleth(
-            filtered_df,
-            locations='Country',
-            locationmode='country names',
-            color='Median Salary',
-            hover_name='Country',
-            hover_data={
-                'Median Salary': True,
-                'Average Salary': True,
-                'Lowest Salary': True,
-                'Highest Salary': True
-            },
-            color_continuous_scale=px.colors.sequential.Plasma,
-            projection=selected_projection,  # Use the selected projection type
-            title='Median Salary by Country'
-        )
-        
-        figSalaryDash.update_layout(
-            title={
-                'text': 'Salary by Country',
-                'y': 0.9,
-                'x': 0.5,
-                'xanchor': 'center',
-                'yanchor': 'top'
-            },
-            geo=dict(
-                showframe=True,
-                showcoastlines=True,
-                coastlinecolor='black',
-                projection_type=selected_projection,
-                bgcolor='#f5ebe0'
-            ),
-            coloraxis_colorbar=dict(
-                title='Salary',
-                tickprefix='$',
-                titlefont=dict(size=14),
-                tickfont=dict(size=12)
-            ),
-            paper_bgcolor='#f5ebe0',
-            plot_bgcolor='#f5ebe0',
-            height=800,
-            width=1600
-        )
-        
-        # Add annotations only when a country is selected
-        if selected_country:
-            if not filtered_df.empty:
-                country_info = filtered_df.iloc[0]
-                annotation_text = (
-                    f"<b>Country:</b> {country_info['Country']}<br>"
-                    f"<b>Median Salary:</b> ${country_info['Median Salary']:,}<br>"
-                    f"<b>Average Salary:</b> ${country_info['Average Salary']:,}<br>"
-                    f"<b>Lowest Salary:</b> ${country_info['Lowest Salary']:,}<br>"
-                    f"<b>Highest Salary:</b> ${country_info['Highest Salary']:,}"
-                )
-                figSalaryDash.add_annotation(
-                    x=0.05,
-                    y=0.05,
-                    text=annotation_text,
-                    showarrow=True,
-                    arrowhead=1,
-                    xref='paper',
-                    yref='paper',
-                    align='center',
-                    font=dict(size=16, color="black"),
-                    borderwidth=1
-                )
-            else:
-                figSalaryDash.add_annotation(
-                    x=0.1,
-                    y=0.1,
-                    text="No country found matching your search.",
-                    showarrow=False,
-                    xref='paper',
-                    yref='paper',
-                    align='center',
-                    font=dict(size=16, color="black"),
-                    borderwidth=1
-                )
+        return with_projection(build_salary_map(selected_country), selected_projection)
 
-        return figSalaryDash
+    register_projection_toggle(app, 'salary-map', 'projection-dropdown-salary')
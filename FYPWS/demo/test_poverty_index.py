@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from poverty_index import INDICATORS, PovertyIndex
+
+
+def frame(salaries):
+    df = pd.DataFrame({'Country': list('ABC')})
+    for i, indicator in enumerate(INDICATORS):
+        df[indicator] = [1.0 + i, 5.0 + i, 10.0 + i]
+    df['Median Salary'] = salaries
+    return df
+
+
+# Updated engine against one built from scratch on the updated values
+def assert_same(engine, df):
+    fresh = PovertyIndex(df)
+    for indicator in INDICATORS:
+        assert engine.low[indicator] == fresh.low[indicator]
+        assert engine.high[indicator] == fresh.high[indicator]
+    np.testing.assert_allclose(engine.index, fresh.index)
+
+
+@pytest.mark.parametrize('country, value', [
+    ('C', 0.0),    # the max moves below the min
+    ('A', 11.0),   # the min moves above the max
+    ('C', 7.0),    # the max shrinks inside the range
+    ('A', 3.0),    # the min grows inside the range
+    ('B', -2.0),   # the range grows below
+    ('B', 12.0),   # the range grows above
+    ('B', 6.0),    # inside the range
+])
+def test_update_matches_fresh_engine(country, value):
+    df = frame([1.0, 5.0, 10.0])
+    engine = PovertyIndex(df)
+    engine.update({country: {'Median Salary': value}})
+    df.loc[df['Country'] == country, 'Median Salary'] = value
+    assert_same(engine, df)
+
+
+def test_update_new_country():
+    df = frame([1.0, 5.0, 10.0])
+    engine = PovertyIndex(df)
+    engine.update({'D': {'Median Salary': 20.0}})
+    row = {indicator: 0.0 for indicator in INDICATORS}
+    row.update({'Country': 'D', 'Median Salary': 20.0})
+    assert_same(engine, pd.concat([df, pd.DataFrame([row])], ignore_index=True))
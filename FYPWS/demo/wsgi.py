@@ -0,0 +1,18 @@
+import gc
+
+import data
+from app import app
+
+# WSGI entry point of the production server: gunicorn -c gunicorn.conf.py
+#
+# gunicorn imports this module once in the master process (preload_app) and forks the
+# workers from it, so the datasets and the pages listed in FYP_PRELOAD_PAGES are
+# loaded before the fork and every worker shares the same memory pages copy-on-write
+# instead of parsing its own copy.
+data.preload()
+
+server = app.server
+
+# Move everything loaded so far out of the garbage collector's reach. Collections in
+# the workers would otherwise write to the shared objects and copy their pages.
+gc.freeze()